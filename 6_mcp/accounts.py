@@ -1,14 +1,75 @@
 from pydantic import BaseModel
+from typing import Literal
 import json
+import os
+from contextlib import contextmanager
+from functools import wraps
+from collections import defaultdict
+import threading
 from dotenv import load_dotenv
-from datetime import datetime
-from market import get_share_price
-from database import write_account, read_account, write_log
+import clock
+from market import get_share_price, get_share_prices
+from database import (
+    write_account,
+    read_account,
+    read_account_version,
+    write_log,
+    write_transaction,
+    write_transactions,
+    write_portfolio_snapshot,
+    clear_account_history,
+    account_transaction,
+    StaleAccountError,
+)
 
 load_dotenv(override=True)
 
 INITIAL_BALANCE = 10_000.0
 SPREAD = 0.002
+MAX_OPTIMISTIC_ATTEMPTS = 5
+
+# The compact account view that goes into prompts and trade responses is kept within this many tokens
+COMPACT_REPORT_TOKENS = int(os.getenv("COMPACT_REPORT_TOKENS", "800"))
+RECENT_TRADES = 10
+RATIONALE_CHARS = 120
+CHARS_PER_TOKEN = 4
+
+# Accounts already loaded by this process, reused while their version in the database is unchanged
+_cache: dict[str, "Account"] = {}
+_cache_stats = {"hits": 0, "misses": 0}
+# Threads of this process share cached accounts, so they take turns to modify each one
+_locks = defaultdict(threading.RLock)
+
+
+def cache_stats() -> dict:
+    """ Return the account cache hit and miss counts for this process. """
+    return {**_cache_stats, "size": len(_cache)}
+
+
+def retry_on_conflict(method):
+    """
+    Run an account operation optimistically; if another process changed the account first, reload it and try again.
+    If it keeps losing the race, take the write lock before reloading so the final attempt cannot conflict.
+    Whatever happens, an operation that fails leaves the account as it is in the database.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        name = self.name.lower()
+        with _locks[name]:
+            try:
+                for _ in range(MAX_OPTIMISTIC_ATTEMPTS):
+                    try:
+                        return method(self, *args, **kwargs)
+                    except StaleAccountError:
+                        self.refresh()
+                with account_transaction(name, expected_version=None):
+                    self.refresh()
+                    return method(self, *args, **kwargs)
+            except BaseException:
+                _cache.pop(name, None)
+                self.refresh()
+                raise
+    return wrapper
 
 
 class Transaction(BaseModel):
@@ -25,6 +86,13 @@ class Transaction(BaseModel):
         return f"{abs(self.quantity)} shares of {self.symbol} at {self.price} each."
 
 
+class Order(BaseModel):
+    action: Literal["buy", "sell"]
+    symbol: str
+    quantity: int
+    rationale: str
+
+
 class Account(BaseModel):
     name: str
     balance: float
@@ -32,9 +100,18 @@ class Account(BaseModel):
     holdings: dict[str, int]
     transactions: list[Transaction]
     portfolio_value_time_series: list[tuple[str, float]]
+    cost_basis: dict[str, float] = {}
+    net_invested: float = 0.0
+    realized_pnl: float = 0.0
+    _version: int = 0
 
     @classmethod
     def get(cls, name: str):
+        cached = _cache.get(name.lower())
+        if cached and cached._version == read_account_version(name):
+            _cache_stats["hits"] += 1
+            return cached
+        _cache_stats["misses"] += 1
         fields = read_account(name.lower())
         if not fields:
             fields = {
@@ -45,21 +122,57 @@ class Account(BaseModel):
                 "transactions": [],
                 "portfolio_value_time_series": []
             }
-            write_account(name, fields)
-        return cls(**fields)
-    
-    
+            fields["version"] = write_account(name, fields["balance"], fields["strategy"], fields["holdings"])
+        version = fields.pop("version")
+        account = cls(**fields)
+        account._version = version
+        _cache[account.name] = account
+        return account
+
+    def refresh(self):
+        """ Reload this account in place from the database. """
+        fields = read_account(self.name)
+        version = fields.pop("version")
+        fresh = Account(**fields)
+        for field in Account.model_fields:
+            setattr(self, field, getattr(fresh, field))
+        self._version = version
+        _cache[self.name.lower()] = self
+
+    @contextmanager
+    def _writing(self):
+        """ Group writes into one transaction, which only commits if nobody else has written the account since we read it. """
+        with account_transaction(self.name.lower(), self._version):
+            yield
+
     def save(self):
-        write_account(self.name.lower(), self.model_dump())
+        """ Write the balance, strategy and holdings; transactions and snapshots are appended as they happen. """
+        with self._writing():
+            self._version = write_account(
+                self.name.lower(),
+                self.balance,
+                self.strategy,
+                self.holdings,
+                self.cost_basis,
+                self.net_invested,
+                self.realized_pnl,
+            )
 
+    @retry_on_conflict
     def reset(self, strategy: str):
         self.balance = INITIAL_BALANCE
         self.strategy = strategy
         self.holdings = {}
         self.transactions = []
         self.portfolio_value_time_series = []
-        self.save()
+        self.cost_basis = {}
+        self.net_invested = 0.0
+        self.realized_pnl = 0.0
+        with self._writing():
+            clear_account_history(self.name)
+            self.save()
 
+    @retry_on_conflict
     def deposit(self, amount: float):
         """ Deposit funds into the account. """
         if amount <= 0:
@@ -68,6 +181,7 @@ class Account(BaseModel):
         print(f"Deposited ${amount}. New balance: ${self.balance}")
         self.save()
 
+    @retry_on_conflict
     def withdraw(self, amount: float):
         """ Withdraw funds from the account, ensuring it doesn't go negative. """
         if amount > self.balance:
@@ -76,9 +190,8 @@ class Account(BaseModel):
         print(f"Withdrew ${amount}. New balance: ${self.balance}")
         self.save()
 
-    def buy_shares(self, symbol: str, quantity: int, rationale: str) -> str:
-        """ Buy shares of a stock if sufficient funds are available. """
-        price = get_share_price(symbol)
+    def _apply_buy(self, symbol: str, quantity: int, price: float, rationale: str) -> Transaction:
+        """ Apply a purchase at the given market price to this account in memory, returning its transaction. """
         buy_price = price * (1 + SPREAD)
         total_cost = buy_price * quantity
         
@@ -87,56 +200,126 @@ class Account(BaseModel):
         elif price==0:
             raise ValueError(f"Unrecognized symbol {symbol}")
         
-        # Update holdings
+        # Update holdings and running totals
         self.holdings[symbol] = self.holdings.get(symbol, 0) + quantity
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.cost_basis[symbol] = self.cost_basis.get(symbol, 0.0) + total_cost
+        self.net_invested += total_cost
+        timestamp = clock.now().strftime("%Y-%m-%d %H:%M:%S")
         # Record transaction
         transaction = Transaction(symbol=symbol, quantity=quantity, price=buy_price, timestamp=timestamp, rationale=rationale)
         self.transactions.append(transaction)
         
         # Update balance
         self.balance -= total_cost
-        self.save()
-        write_log(self.name, "account", f"Bought {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
+        return transaction
 
-    def sell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
-        """ Sell shares of a stock if the user has enough shares. """
+    def _apply_sell(self, symbol: str, quantity: int, price: float, rationale: str) -> Transaction:
+        """ Apply a sale at the given market price to this account in memory, returning its transaction. """
         if self.holdings.get(symbol, 0) < quantity:
             raise ValueError(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
         
-        price = get_share_price(symbol)
         sell_price = price * (1 - SPREAD)
         total_proceeds = sell_price * quantity
         
-        # Update holdings
+        # Update holdings and running totals, taking the sold shares out of the cost basis at their average cost
+        cost_sold = self.cost_basis.get(symbol, 0.0) * quantity / self.holdings[symbol]
         self.holdings[symbol] -= quantity
+        self.cost_basis[symbol] = self.cost_basis.get(symbol, 0.0) - cost_sold
+        self.realized_pnl += total_proceeds - cost_sold
+        self.net_invested -= total_proceeds
         
         # If shares are completely sold, remove from holdings
         if self.holdings[symbol] == 0:
             del self.holdings[symbol]
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.cost_basis.pop(symbol, None)
+        timestamp = clock.now().strftime("%Y-%m-%d %H:%M:%S")
         # Record transaction
         transaction = Transaction(symbol=symbol, quantity=-quantity, price=sell_price, timestamp=timestamp, rationale=rationale)  # negative quantity for sell
         self.transactions.append(transaction)
 
         # Update balance
         self.balance += total_proceeds
-        self.save()
-        write_log(self.name, "account", f"Sold {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
+        return transaction
 
-    def calculate_portfolio_value(self):
-        """ Calculate the total value of the user's portfolio. """
-        total_value = self.balance
-        for symbol, quantity in self.holdings.items():
-            total_value += get_share_price(symbol) * quantity
-        return total_value
+    def buy_shares(self, symbol: str, quantity: int, rationale: str) -> str:
+        """ Buy shares of a stock if sufficient funds are available. """
+        # Price the trade before any lock is taken, so no write lock is ever held across a market data request
+        self._buy(symbol, quantity, get_share_price(symbol), rationale)
+        return self._completed(f"Bought {quantity} of {symbol}", "Completed")
+
+    @retry_on_conflict
+    def _buy(self, symbol: str, quantity: int, price: float, rationale: str) -> None:
+        transaction = self._apply_buy(symbol, quantity, price, rationale)
+        with self._writing():
+            self.save()
+            self._version = write_transaction(self.name, transaction.model_dump())
+
+    def sell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
+        """ Sell shares of a stock if the user has enough shares. """
+        if self.holdings.get(symbol, 0) < quantity:
+            raise ValueError(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
+        self._sell(symbol, quantity, get_share_price(symbol), rationale)
+        return self._completed(f"Sold {quantity} of {symbol}", "Completed")
+
+    @retry_on_conflict
+    def _sell(self, symbol: str, quantity: int, price: float, rationale: str) -> None:
+        transaction = self._apply_sell(symbol, quantity, price, rationale)
+        with self._writing():
+            self.save()
+            self._version = write_transaction(self.name, transaction.model_dump())
+
+    def execute_orders(self, orders: list[Order]) -> str:
+        """
+        Execute several orders as one: every order is priced from a single lookup, sells are applied before buys
+        so they can fund them, and either all the orders succeed or none do and the account is left unchanged.
+        """
+        if not orders:
+            raise ValueError("No orders were given.")
+        prices = get_share_prices(list(dict.fromkeys(order.symbol for order in orders)))
+        transactions = self._execute_orders(orders, prices)
+        summary = ", ".join(
+            f"{'Bought' if t.quantity > 0 else 'Sold'} {abs(t.quantity)} of {t.symbol}" for t in transactions
+        )
+        return self._completed(summary, f"Completed {len(transactions)} orders")
+
+    @retry_on_conflict
+    def _execute_orders(self, orders: list[Order], prices: dict[str, float]) -> list[Transaction]:
+        transactions, errors = [], []
+        for order in sorted(orders, key=lambda order: order.action != "sell"):
+            try:
+                if order.quantity <= 0:
+                    raise ValueError(f"Quantity must be positive, not {order.quantity}")
+                apply = self._apply_sell if order.action == "sell" else self._apply_buy
+                transactions.append(apply(order.symbol, order.quantity, prices[order.symbol], order.rationale))
+            except ValueError as e:
+                errors.append(f"{order.action} {order.quantity} {order.symbol}: {e}")
+        if errors:
+            # retry_on_conflict reloads the account, discarding the orders already applied in memory
+            raise ValueError("No orders were executed. " + " ".join(errors))
+        with self._writing():
+            self.save()
+            self._version = write_transactions(self.name, [transaction.model_dump() for transaction in transactions])
+        return transactions
+
+    def _completed(self, summary: str, message: str) -> str:
+        """ Log a committed trade and describe the account after it; the trade stands even if that description fails. """
+        try:
+            write_log(self.name, "account", summary)
+            return f"{message}. Latest details:\n" + self.compact_report()
+        except Exception as e:
+            return f"{message}. The latest account details could not be retrieved: {e}"
+
+    def calculate_portfolio_value(self, prices: dict[str, float] | None = None):
+        """ Calculate the total value of the user's portfolio, looking up all the prices not given at once. """
+        prices = dict(prices or {})
+        missing = [symbol for symbol in self.holdings if symbol not in prices]
+        if missing:
+            prices.update(get_share_prices(missing))
+        return self.balance + sum(prices[symbol] * quantity for symbol, quantity in self.holdings.items())
 
     def calculate_profit_loss(self, portfolio_value: float):
-        """ Calculate profit or loss from the initial spend. """
-        initial_spend = sum(transaction.total() for transaction in self.transactions)
-        return portfolio_value - initial_spend - self.balance
+        """ Calculate profit or loss from the initial spend, using the running total of cash invested. """
+        return portfolio_value - self.net_invested - self.balance
 
     def get_holdings(self):
         """ Report the current holdings of the user. """
@@ -150,23 +333,112 @@ class Account(BaseModel):
         """ List all transactions made by the user. """
         return [transaction.model_dump() for transaction in self.transactions]
     
+    def _record_value(self, prices: dict[str, float]) -> tuple[float, float]:
+        """ Value the portfolio at the given prices and record it in the time series; returns the value and profit/loss. """
+        portfolio_value = self.calculate_portfolio_value(prices)
+        snapshot = (clock.now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value)
+        self.portfolio_value_time_series.append(snapshot)
+        with self._writing():
+            self._version = write_portfolio_snapshot(self.name, *snapshot)
+        return portfolio_value, self.calculate_profit_loss(portfolio_value)
+
     def report(self) -> str:
         """ Return a json string representing the account.  """
-        portfolio_value = self.calculate_portfolio_value()
-        self.portfolio_value_time_series.append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value))
-        self.save()
-        pnl = self.calculate_profit_loss(portfolio_value)
+        # As for trades, prices are looked up before any lock; only symbols bought by a concurrent writer are looked up later
+        return self._report(get_share_prices(list(self.holdings)))
+
+    @retry_on_conflict
+    def _report(self, prices: dict[str, float]) -> str:
+        portfolio_value, pnl = self._record_value(prices)
         data = self.model_dump()
         data["total_portfolio_value"] = portfolio_value
         data["total_profit_loss"] = pnl
+        data["realized_profit_loss"] = self.realized_pnl
+        data["unrealized_profit_loss"] = pnl - self.realized_pnl
         write_log(self.name, "account", f"Retrieved account details")
         return json.dumps(data)
-    
+
+    def compact_report(self, max_tokens: int = COMPACT_REPORT_TOKENS) -> str:
+        """
+        Return a json string summarizing the account within max_tokens: cash, holdings, profit and loss,
+        statistics over all trades and the most recent trades. To fit, the oldest of the trades are dropped first,
+        then the smallest holdings by value are folded into a single total of other holdings.
+        """
+        return self._compact_report(get_share_prices(list(self.holdings)), max_tokens)
+
+    @retry_on_conflict
+    def _compact_report(self, prices: dict[str, float], max_tokens: int) -> str:
+        portfolio_value, pnl = self._record_value(prices)
+        values = {symbol: prices.get(symbol, 0.0) * quantity for symbol, quantity in self.holdings.items()}
+        ranked = sorted(self.holdings, key=lambda symbol: (-values[symbol], symbol))
+        buys = [t for t in self.transactions if t.quantity > 0]
+        sells = [t for t in self.transactions if t.quantity < 0]
+        data = {
+            "name": self.name,
+            "balance": round(self.balance, 2),
+            "holdings": {
+                symbol: {
+                    "quantity": self.holdings[symbol],
+                    "average_cost": round(self.cost_basis.get(symbol, 0.0) / self.holdings[symbol], 2),
+                    "value": round(values[symbol], 2),
+                }
+                for symbol in ranked
+            },
+            "total_portfolio_value": round(portfolio_value, 2),
+            "total_profit_loss": round(pnl, 2),
+            "realized_profit_loss": round(self.realized_pnl, 2),
+            "unrealized_profit_loss": round(pnl - self.realized_pnl, 2),
+            "trade_stats": {
+                "trades": len(self.transactions),
+                "buys": len(buys),
+                "sells": len(sells),
+                "bought_value": round(sum(t.total() for t in buys), 2),
+                "sold_value": round(-sum(t.total() for t in sells), 2),
+                "first_trade": self.transactions[0].timestamp if self.transactions else None,
+            },
+            "recent_trades": [
+                {
+                    "symbol": t.symbol,
+                    "quantity": t.quantity,
+                    "price": round(t.price, 2),
+                    "timestamp": t.timestamp,
+                    "rationale": t.rationale[:RATIONALE_CHARS],
+                }
+                for t in self.transactions[-RECENT_TRADES:]
+            ],
+        }
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        report = json.dumps(data)
+        while len(report) > max_chars and data["recent_trades"]:
+            data["recent_trades"].pop(0)
+            report = json.dumps(data)
+        if len(report) > max_chars:
+            holdings = data["holdings"]
+
+            def keeping(top: int) -> str:
+                rest = ranked[top:]
+                data["holdings"] = {symbol: holdings[symbol] for symbol in ranked[:top]}
+                data["other_holdings"] = {"symbols": len(rest), "value": round(sum(values[symbol] for symbol in rest), 2)}
+                return json.dumps(data)
+
+            # Keep as many of the largest holdings as fit
+            low, high = 0, len(ranked) - 1
+            while low < high:
+                middle = (low + high + 1) // 2
+                if len(keeping(middle)) <= max_chars:
+                    low = middle
+                else:
+                    high = middle - 1
+            report = keeping(low)
+        write_log(self.name, "account", f"Retrieved compact account details")
+        return report
+
     def get_strategy(self) -> str:
         """ Return the strategy of the account """
         write_log(self.name, "account", f"Retrieved strategy")
         return self.strategy
     
+    @retry_on_conflict
     def change_strategy(self, strategy: str) -> str:
         """ At your discretion, if you choose to, call this to change your investment strategy for the future """
         self.strategy = strategy
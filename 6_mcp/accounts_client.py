@@ -1,3 +1,6 @@
+import asyncio
+import anyio
+from datetime import timedelta
 import mcp
 from mcp.client.stdio import stdio_client
 from mcp import StdioServerParameters
@@ -6,34 +9,113 @@ import json
 
 params = StdioServerParameters(command="uv", args=["run", "accounts_server.py"], env=None)
 
+REQUEST_TIMEOUT = timedelta(seconds=120)
+
+# Errors that mean the server process or its pipes have gone away, so it's worth reconnecting
+DISCONNECTED = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream, ConnectionError)
+
+
+class AccountsClient:
+    """
+    A single long-lived session with the accounts server. The session is owned by a background task,
+    so any task can make requests over it concurrently; they're pipelined over the one connection.
+    If the server goes away, the client reconnects and retries reads once. A tool call is not retried,
+    since it may already have traded before the connection dropped; it reconnects and raises.
+    """
+
+    def __init__(self, server_params: StdioServerParameters = params):
+        self.server_params = server_params
+        self.session: mcp.ClientSession | None = None
+        self.tools = None
+        self.loop = None
+        self._task = None
+        self._ready = None
+        self._stop = None
+        self._lock = asyncio.Lock()
+
+    async def _run(self):
+        try:
+            async with stdio_client(self.server_params) as streams:
+                async with mcp.ClientSession(*streams, read_timeout_seconds=REQUEST_TIMEOUT) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set_result(None)
+                    await self._stop.wait()
+        except BaseException as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self.session = None
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # A new event loop (e.g. another asyncio.run) can't use a session opened on the old one
+            self._lock = asyncio.Lock()
+            self._task = None
+            self.session = None
+            self.loop = loop
+        async with self._lock:
+            if self.session and self._task and not self._task.done():
+                return
+            self._ready = loop.create_future()
+            self._stop = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            await self._ready
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._stop.set()
+            await self._task
+        self._task = None
+
+    async def reconnect(self):
+        await self.close()
+        await self.connect()
+
+    async def _request(self, request, retry: bool = True):
+        await self.connect()
+        try:
+            return await request(self.session)
+        except DISCONNECTED:
+            await self.reconnect()
+            if not retry:
+                raise
+            return await request(self.session)
+
+    async def list_tools(self, refresh: bool = False):
+        if self.tools is None or refresh:
+            result = await self._request(lambda session: session.list_tools())
+            self.tools = result.tools
+        return self.tools
+
+    async def call_tool(self, tool_name, tool_args):
+        return await self._request(lambda session: session.call_tool(tool_name, tool_args), retry=False)
+
+    async def read_resource(self, uri: str) -> str:
+        result = await self._request(lambda session: session.read_resource(uri))
+        return result.contents[0].text
+
+
+_client = AccountsClient()
+
 
 async def list_accounts_tools():
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            tools_result = await session.list_tools()
-            return tools_result.tools
-        
+    return await _client.list_tools()
+
 async def call_accounts_tool(tool_name, tool_args):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.call_tool(tool_name, tool_args)
-            return result
-            
+    return await _client.call_tool(tool_name, tool_args)
+
 async def read_accounts_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://accounts_server/{name}")
-            return result.contents[0].text
-        
+    return await _client.read_resource(f"accounts://accounts_server/{name}")
+
+async def read_compact_account_resource(name):
+    return await _client.read_resource(f"accounts://compact/{name}")
+
 async def read_strategy_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://strategy/{name}")
-            return result.contents[0].text
+    return await _client.read_resource(f"accounts://strategy/{name}")
 
 async def get_accounts_tools_openai():
     openai_tools = []
@@ -44,7 +126,7 @@ async def get_accounts_tools_openai():
             description=tool.description,
             params_json_schema=schema,
             on_invoke_tool=lambda ctx, args, toolname=tool.name: call_accounts_tool(toolname, json.loads(args))
-                
+
         )
         openai_tools.append(openai_tool)
-    return openai_tools
\ No newline at end of file
+    return openai_tools
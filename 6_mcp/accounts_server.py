@@ -1,8 +1,12 @@
+import asyncio
 from mcp.server.fastmcp import FastMCP
-from accounts import Account
+from accounts import Account, Order
 
 mcp = FastMCP("accounts_server")
 
+# Account code is synchronous (SQLite writes, and price lookups on a cache miss), so it runs in a worker thread,
+# never on the event loop, which may be the trading floor's own when the server is mounted in-process
+
 @mcp.tool()
 async def get_balance(name: str) -> float:
     """Get the cash balance of the given account name.
@@ -10,7 +14,8 @@ async def get_balance(name: str) -> float:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).balance
+    account = await asyncio.to_thread(Account.get, name)
+    return account.balance
 
 @mcp.tool()
 async def get_holdings(name: str) -> dict[str, int]:
@@ -19,7 +24,8 @@ async def get_holdings(name: str) -> dict[str, int]:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).holdings
+    account = await asyncio.to_thread(Account.get, name)
+    return account.holdings
 
 @mcp.tool()
 async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> float:
@@ -31,7 +37,8 @@ async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> f
         quantity: The quantity of shares to buy
         rationale: The rationale for the purchase and fit with the account's strategy
     """
-    return Account.get(name).buy_shares(symbol, quantity, rationale)
+    account = await asyncio.to_thread(Account.get, name)
+    return await asyncio.to_thread(account.buy_shares, symbol, quantity, rationale)
 
 
 @mcp.tool()
@@ -44,7 +51,20 @@ async def sell_shares(name: str, symbol: str, quantity: int, rationale: str) ->
         quantity: The quantity of shares to sell
         rationale: The rationale for the sale and fit with the account's strategy
     """
-    return Account.get(name).sell_shares(symbol, quantity, rationale)
+    account = await asyncio.to_thread(Account.get, name)
+    return await asyncio.to_thread(account.sell_shares, symbol, quantity, rationale)
+
+@mcp.tool()
+async def execute_orders(name: str, orders: list[Order]) -> str:
+    """Execute several buy and sell orders together, e.g. to rebalance, in place of separate buy_shares and sell_shares calls.
+    All orders use the same price snapshot and sells are done first; if any order can't be filled, none are.
+
+    Args:
+        name: The name of the account holder
+        orders: The orders, each with an action ("buy" or "sell"), symbol, quantity and rationale
+    """
+    account = await asyncio.to_thread(Account.get, name)
+    return await asyncio.to_thread(account.execute_orders, orders)
 
 @mcp.tool()
 async def change_strategy(name: str, strategy: str) -> str:
@@ -54,17 +74,23 @@ async def change_strategy(name: str, strategy: str) -> str:
         name: The name of the account holder
         strategy: The new strategy for the account
     """
-    return Account.get(name).change_strategy(strategy)
+    account = await asyncio.to_thread(Account.get, name)
+    return await asyncio.to_thread(account.change_strategy, strategy)
 
 @mcp.resource("accounts://accounts_server/{name}")
 async def read_account_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.report()
+    account = await asyncio.to_thread(Account.get, name.lower())
+    return await asyncio.to_thread(account.report)
+
+@mcp.resource("accounts://compact/{name}")
+async def read_compact_account_resource(name: str) -> str:
+    account = await asyncio.to_thread(Account.get, name.lower())
+    return await asyncio.to_thread(account.compact_report)
 
 @mcp.resource("accounts://strategy/{name}")
 async def read_strategy_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.get_strategy()
+    account = await asyncio.to_thread(Account.get, name.lower())
+    return await asyncio.to_thread(account.get_strategy)
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file
@@ -4,7 +4,13 @@ import pandas as pd
 from trading_floor import names, lastnames, short_model_names
 import plotly.express as px
 from accounts import Account
-from database import read_log
+from datetime import datetime, timedelta, timezone
+from database import read_log_since, read_portfolio_series, read_span_stats
+from read_model import ReadModel
+
+LOG_LINES = 13
+CHART_POINTS = 300
+LATENCY_WINDOWS = {"Last hour": 1, "Last day": 24, "Last week": 24 * 7}
 
 mapper = {
     "trace": Color.WHITE,
@@ -33,13 +39,21 @@ class Trader:
         return self.account.get_strategy()
 
     def get_portfolio_value_df(self) -> pd.DataFrame:
-        df = pd.DataFrame(self.account.portfolio_value_time_series, columns=["datetime", "value"])
+        """The portfolio value history, downsampled in the database to at most CHART_POINTS buckets"""
+        series = read_portfolio_series(self.name, CHART_POINTS)
+        df = pd.DataFrame(series, columns=["datetime", "open", "high", "low", "value"])
         df["datetime"] = pd.to_datetime(df["datetime"])
         return df
 
     def get_portfolio_value_chart(self):
         df = self.get_portfolio_value_df()
         fig = px.line(df, x="datetime", y="value")
+        # Shade the range each bucket covered, so swings inside a bucket still show
+        fig.add_scatter(x=df["datetime"], y=df["high"], mode="lines", line=dict(width=0), showlegend=False, hoverinfo="skip")
+        fig.add_scatter(
+            x=df["datetime"], y=df["low"], mode="lines", line=dict(width=0), fill="tonexty",
+            fillcolor="rgba(99,110,250,0.2)", showlegend=False, hoverinfo="skip",
+        )
         margin = dict(l=40, r=20, t=20, b=40)
         fig.update_layout(
             height=300,
@@ -80,22 +94,35 @@ class Trader:
         emoji = "⬆" if pnl >= 0 else "⬇"
         return f"<div style='text-align: center;background-color:{color};'><span style='font-size:32px'>${portfolio_value:,.0f}</span><span style='font-size:24px'>&nbsp;&nbsp;&nbsp;{emoji}&nbsp;${pnl:,.0f}</span></div>"
 
-    def get_logs(self, previous=None) -> str:
-        logs = read_log(self.name, last_n=13)
-        response = ""
-        for log in logs:
-            timestamp, type, message = log
+    def render(self) -> tuple:
+        """Reload the account and render its panels: value, chart, holdings and transactions"""
+        self.reload()
+        return (
+            self.get_portfolio_value(),
+            self.get_portfolio_value_chart(),
+            self.get_holdings_df(),
+            self.get_transactions_df(),
+        )
+
+    def read_logs(self) -> tuple[str, list[str], int]:
+        """The recent log lines, and the id of the last one"""
+        logs = read_log_since(self.name, limit=LOG_LINES)
+        html, lines = self.get_logs([], logs)
+        return html, lines, logs[-1][0] if logs else 0
+
+    def get_logs(self, lines: list[str], logs) -> tuple[str, list[str]]:
+        """Append log entries to a session's lines, keeping the last LOG_LINES"""
+        for _, timestamp, type, message in logs:
             color = mapper.get(type, Color.WHITE).value
-            response += f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>"
-        response = f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
-        if response != previous:
-            return response
-        return gr.update()
+            lines.append(f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>")
+        lines = lines[-LOG_LINES:]
+        return f"<div style='height:250px; overflow-y:auto;'>{''.join(lines)}</div>", lines
 
 
 class TraderView:
-    def __init__(self, trader: Trader):
+    def __init__(self, trader: Trader, read_model: ReadModel):
         self.trader = trader
+        self.read_model = read_model
         self.portfolio_value = None
         self.chart = None
         self.holdings_table = None
@@ -105,16 +132,13 @@ class TraderView:
         with gr.Column():
             gr.HTML(self.trader.get_title())
             with gr.Row():
-                self.portfolio_value = gr.HTML(self.trader.get_portfolio_value)
+                self.portfolio_value = gr.HTML()
             with gr.Row():
-                self.chart = gr.Plot(
-                    self.trader.get_portfolio_value_chart, container=True, show_label=False
-                )
+                self.chart = gr.Plot(container=True, show_label=False)
             with gr.Row(variant="panel"):
-                self.log = gr.HTML(self.trader.get_logs)
+                self.log = gr.HTML()
             with gr.Row():
                 self.holdings_table = gr.Dataframe(
-                    value=self.trader.get_holdings_df,
                     label="Holdings",
                     headers=["Symbol", "Quantity"],
                     row_count=(5, "dynamic"),
@@ -124,7 +148,6 @@ class TraderView:
                 )
             with gr.Row():
                 self.transactions_table = gr.Dataframe(
-                    value=self.trader.get_transactions_df,
                     label="Recent Transactions",
                     headers=["Timestamp", "Symbol", "Quantity", "Price", "Rationale"],
                     row_count=(5, "dynamic"),
@@ -133,36 +156,50 @@ class TraderView:
                     elem_classes=["dataframe-fix"],
                 )
 
-        timer = gr.Timer(value=120)
-        timer.tick(
-            fn=self.refresh,
-            inputs=[],
-            outputs=[
-                self.portfolio_value,
-                self.chart,
-                self.holdings_table,
-                self.transactions_table,
-            ],
-            show_progress="hidden",
-            queue=False,
-        )
-        log_timer = gr.Timer(value=0.5)
-        log_timer.tick(
-            fn=self.trader.get_logs,
-            inputs=[self.log],
-            outputs=[self.log],
-            show_progress="hidden",
-            queue=False,
-        )
+    def outputs(self) -> list:
+        return [self.portfolio_value, self.chart, self.holdings_table, self.transactions_table, self.log]
+
+    async def stream(self):
+        """Push this session the shared view of the trader, then whatever part of it changes"""
+        async for kind, update in self.read_model.updates(self.trader.name):
+            if kind == "logs":
+                yield gr.update(), gr.update(), gr.update(), gr.update(), update
+            else:
+                yield *update, gr.update()
 
-    def refresh(self):
-        self.trader.reload()
-        return (
-            self.trader.get_portfolio_value(),
-            self.trader.get_portfolio_value_chart(),
-            self.trader.get_holdings_df(),
-            self.trader.get_transactions_df(),
-        )
+
+class LatencyView:
+    """Latency percentiles, error rates and token use per tool, MCP server and model, from the recorded spans"""
+
+    groups = {"tool": "Tool", "server": "MCP Server", "model": "Model"}
+
+    def __init__(self):
+        self.window = None
+        self.refresh = None
+        self.tables = []
+
+    def make_ui(self):
+        with gr.Row():
+            self.window = gr.Radio(list(LATENCY_WINDOWS), value="Last day", show_label=False)
+            self.refresh = gr.Button("Refresh", scale=0)
+        for label in self.groups.values():
+            with gr.Row():
+                self.tables.append(gr.Dataframe(label=f"By {label}", max_height=400, elem_classes=["dataframe-fix"]))
+
+    def get_latency_df(self, group: str, since: str) -> pd.DataFrame:
+        columns = [self.groups[group], "Calls", "Errors", "p50 ms", "p95 ms", "Max ms", "Input tokens", "Output tokens"]
+        df = pd.DataFrame(read_span_stats(group, since), columns=columns)
+        df.insert(3, "Error rate", (df["Errors"] / df["Calls"]).map("{:.1%}".format))
+        return df.round({"p50 ms": 0, "p95 ms": 0, "Max ms": 0})
+
+    def render(self, window: str) -> list[pd.DataFrame]:
+        since = datetime.now(timezone.utc) - timedelta(hours=LATENCY_WINDOWS[window])
+        return [self.get_latency_df(group, since.strftime("%Y-%m-%d %H:%M:%S")) for group in self.groups]
+
+    def wire(self, ui: gr.Blocks):
+        ui.load(self.render, inputs=self.window, outputs=self.tables, show_progress="hidden")
+        self.window.change(self.render, inputs=self.window, outputs=self.tables, show_progress="hidden")
+        self.refresh.click(self.render, inputs=self.window, outputs=self.tables, show_progress="hidden")
 
 
 # Main UI construction
@@ -173,14 +210,23 @@ def create_ui():
         Trader(trader_name, lastname, model_name)
         for trader_name, lastname, model_name in zip(names, lastnames, short_model_names)
     ]
-    trader_views = [TraderView(trader) for trader in traders]
+    read_model = ReadModel(traders)
+    trader_views = [TraderView(trader, read_model) for trader in traders]
+    latency_view = LatencyView()
 
     with gr.Blocks(
         title="Traders", css=css, js=js, theme=gr.themes.Default(primary_hue="sky"), fill_width=True
     ) as ui:
-        with gr.Row():
-            for trader_view in trader_views:
-                trader_view.make_ui()
+        with gr.Tab("Traders"):
+            with gr.Row():
+                for trader_view in trader_views:
+                    trader_view.make_ui()
+        with gr.Tab("Latency"):
+            latency_view.make_ui()
+        latency_view.wire(ui)
+        for trader_view in trader_views:
+            # Each session holds one open stream per trader, so they mustn't queue behind each other
+            ui.load(trader_view.stream, outputs=trader_view.outputs(), show_progress="hidden", concurrency_limit=None)
 
     return ui
 
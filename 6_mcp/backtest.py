@@ -0,0 +1,390 @@
+"""
+Replay stored closing prices through the accounts and market tools with a simulated clock, to compare strategies offline.
+The real Trader agent runs each day with its prompts and tools, but a scripted model stands in for the LLM, placing
+the orders of a deterministic strategy through the tools, so a run takes seconds and repeats exactly for a seed.
+
+uv run backtest.py [--prices prices.csv] [--start 2025-01-01] [--end 2025-06-30] [--strategies momentum,random] [--seeds 5] [--workers 4]
+uv run backtest.py --import prices.csv      # store a CSV or Parquet file of date,ticker,close rows in the market table
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from agents import Model, ModelResponse, Usage, set_tracing_disabled
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+)
+from accounts import SPREAD
+from mcp_transports import InProcessMCPServer
+from traders import Trader, local_models
+
+BACKTEST_DIR = "backtests"
+ACCOUNT = "backtest"
+# Closing prices are stamped at the close, so each simulated trading day runs at 16:00
+TRADING_TIME = "16:00:00"
+DEFAULT_SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "JPM", "XOM", "SPY"]
+
+
+class HistoricalPrices:
+    """Closing prices by date; a lookup returns each symbol's most recent close on or before the simulated date"""
+
+    def __init__(self, rows: list[tuple[str, str, float]]):
+        self.history: dict[str, tuple[list[str], list[float]]] = {}
+        for date, ticker, close in sorted(rows):
+            dates, closes = self.history.setdefault(ticker, ([], []))
+            dates.append(date)
+            closes.append(close)
+        self.dates = sorted({date for date, _, _ in rows})
+
+    @classmethod
+    def from_database(cls, symbols: list[str], start: str | None = None, end: str | None = None):
+        from database import read_price_history
+
+        return cls([(date, symbol, close) for symbol in symbols for date, close in read_price_history(symbol, start, end)])
+
+    @classmethod
+    def from_file(cls, path: str, symbols: list[str] | None = None):
+        frame = read_price_file(path)
+        if symbols:
+            frame = frame[frame["ticker"].isin(symbols)]
+        return cls(list(frame.itertuples(index=False, name=None)))
+
+    def between(self, start: str | None, end: str | None) -> list[str]:
+        return [date for date in self.dates if (not start or date >= start) and (not end or date <= end)]
+
+    def as_of(self, date: str, symbols: list[str]) -> dict[str, float]:
+        prices = {}
+        for symbol in symbols:
+            dates, closes = self.history.get(symbol, ([], []))
+            index = bisect.bisect_right(dates, date)
+            prices[symbol] = closes[index - 1] if index else 0.0
+        return prices
+
+    def __call__(self, symbols: list[str]) -> dict[str, float]:
+        import clock
+
+        return self.as_of(clock.now().strftime("%Y-%m-%d"), symbols)
+
+
+def read_price_file(path: str):
+    """Read a CSV or Parquet file with date, ticker and close columns"""
+    import pandas as pd
+
+    frame = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+    frame = frame[["date", "ticker", "close"]].dropna()
+    frame["date"] = pd.to_datetime(frame["date"]).dt.strftime("%Y-%m-%d")
+    frame["close"] = frame["close"].astype(float)
+    return frame
+
+
+def import_prices(path: str) -> None:
+    """Store the closes in a CSV or Parquet file in the market table, one date at a time"""
+    from database import write_market
+
+    frame = read_price_file(path)
+    for date, rows in frame.groupby("date"):
+        write_market(date, dict(zip(rows["ticker"], rows["close"])), date)
+    print(f"Imported {len(frame)} prices over {frame['date'].nunique()} dates from {path}")
+
+
+def tool_output(output: str):
+    """The value a tool returned, from the text of an MCP tool result as the agent passes it back to the model"""
+    try:
+        value = json.loads(output)
+    except json.JSONDecodeError:
+        return output
+    if isinstance(value, dict) and value.get("type") == "text":
+        try:
+            return json.loads(value["text"])
+        except json.JSONDecodeError:
+            return value["text"]
+    return value
+
+
+def buy_and_hold(symbols: list[str], prices: dict, holdings: dict, balance: float, rng: random.Random, day: int, memory: dict):
+    """Spend the cash evenly across the symbols on the first day, then do nothing"""
+    if day > 0:
+        return []
+    budget = balance / len(symbols) * 0.99
+    return [
+        ("buy_shares", {"symbol": symbol, "quantity": int(budget // price), "rationale": "Buy and hold"})
+        for symbol, price in prices.items()
+        if price and int(budget // price)
+    ]
+
+
+def momentum(symbols: list[str], prices: dict, holdings: dict, balance: float, rng: random.Random, day: int, memory: dict):
+    """Hold the three symbols that rose most since the previous day, rotating out of the rest in one batch of orders"""
+    previous = memory.get("prices")
+    memory["prices"] = prices
+    if not previous:
+        return []
+    changes = {symbol: price / previous[symbol] - 1 for symbol, price in prices.items() if price and previous.get(symbol)}
+    winners = sorted(changes, key=lambda symbol: (-changes[symbol], symbol))[:3]
+    orders = [
+        {"action": "sell", "symbol": symbol, "quantity": quantity, "rationale": "Momentum faded"}
+        for symbol, quantity in holdings.items()
+        if symbol not in winners
+    ]
+    cash = balance + sum(prices[order["symbol"]] * order["quantity"] * (1 - SPREAD) for order in orders)
+    budget = cash / len(winners) * 0.99 if winners else 0
+    orders += [
+        {"action": "buy", "symbol": symbol, "quantity": int(budget // prices[symbol]), "rationale": "Momentum"}
+        for symbol in winners
+        if symbol not in holdings and int(budget // prices[symbol])
+    ]
+    return [("execute_orders", {"orders": orders})] if orders else []
+
+
+def random_walk(symbols: list[str], prices: dict, holdings: dict, balance: float, rng: random.Random, day: int, memory: dict):
+    """Make a few random trades each day; the seed decides which"""
+    held = dict(holdings)
+    calls = []
+    for _ in range(rng.randint(0, 3)):
+        symbol = rng.choice(symbols)
+        if rng.random() < 0.6:
+            calls.append(("buy_shares", {"symbol": symbol, "quantity": rng.randint(1, 10), "rationale": "Random buy"}))
+        elif held.get(symbol):
+            quantity = rng.randint(1, held[symbol])
+            held[symbol] -= quantity
+            calls.append(("sell_shares", {"symbol": symbol, "quantity": quantity, "rationale": "Random sell"}))
+    return calls
+
+
+STRATEGIES = {"buy_and_hold": buy_and_hold, "momentum": momentum, "random": random_walk}
+
+
+class Script:
+    """What the scripted models of one backtest share: the strategy, its random generator and memory, and the day"""
+
+    def __init__(self, strategy: str, seed: int, symbols: list[str]):
+        self.decide = STRATEGIES[strategy]
+        self.symbols = symbols
+        self.rng = random.Random(seed)
+        self.memory = {}
+        self.day = 0
+
+
+class ScriptedModel(Model):
+    """
+    A deterministic stand-in for an LLM, answering the real Trader agent with scripted tool calls.
+    Its first turn looks up the prices, holdings and balance with the trader's tools; the next passes what they
+    returned to the strategy and places its orders, one tool call per turn so they are applied in a fixed order;
+    then it ends the run. The researcher gets one too, which answers at once, so no research servers are needed.
+    """
+
+    def __init__(self, script: Script):
+        self.script = script
+        self.looked_up = False
+        self.calls = None
+
+    async def get_response(self, system_instructions, input, model_settings, tools, *args, **kwargs) -> ModelResponse:
+        if "buy_shares" not in {tool.name for tool in tools}:
+            return self.respond(message="There is no research available in a backtest.")
+        day = self.script.day
+        if not self.looked_up:
+            self.looked_up = True
+            return self.respond(
+                calls=[
+                    (f"{day}-prices", "lookup_share_prices", {"symbols": self.script.symbols}),
+                    (f"{day}-holdings", "get_holdings", {"name": ACCOUNT}),
+                    (f"{day}-balance", "get_balance", {"name": ACCOUNT}),
+                ]
+            )
+        if self.calls is None:
+            outputs = {
+                item["call_id"]: tool_output(item["output"])
+                for item in input
+                if isinstance(item, dict) and item.get("type") == "function_call_output"
+            }
+            decisions = self.script.decide(
+                self.script.symbols,
+                outputs[f"{day}-prices"],
+                outputs[f"{day}-holdings"],
+                outputs[f"{day}-balance"],
+                self.script.rng,
+                day,
+                self.script.memory,
+            )
+            self.calls = [
+                (f"{day}-{index}", tool, {"name": ACCOUNT, **arguments}) for index, (tool, arguments) in enumerate(decisions)
+            ]
+        if self.calls:
+            return self.respond(calls=[self.calls.pop(0)])
+        return self.respond(message="Done for today.")
+
+    def respond(self, calls: list[tuple[str, str, dict]] = (), message: str | None = None) -> ModelResponse:
+        output = [
+            ResponseFunctionToolCall(
+                id=call_id, call_id=call_id, name=name, arguments=json.dumps(arguments), type="function_call"
+            )
+            for call_id, name, arguments in calls
+        ]
+        if message:
+            content = [ResponseOutputText(text=message, type="output_text", annotations=[])]
+            output.append(
+                ResponseOutputMessage(id="message", content=content, role="assistant", status="completed", type="message")
+            )
+        return ModelResponse(output=output, usage=Usage(requests=1), response_id=None)
+
+    async def stream_response(self, *args, **kwargs):
+        """The same scripted turn, as the single completed event a streamed run builds its response from"""
+        response = await self.get_response(*args, **kwargs)
+        yield ResponseCompletedEvent(
+            type="response.completed",
+            sequence_number=0,
+            response=Response(
+                id="backtest",
+                created_at=0,
+                model="scripted",
+                object="response",
+                output=response.output,
+                tool_choice="auto",
+                tools=[],
+                parallel_tool_calls=False,
+            ),
+        )
+
+
+class BacktestTrader(Trader):
+    """The real Trader, with its agent, prompts and tools, reading its account through the in-process accounts server"""
+
+    def __init__(self, model_name: str, accounts: InProcessMCPServer):
+        super().__init__(ACCOUNT, "Backtest", model_name)
+        self.accounts = accounts
+
+    async def read_resource(self, uri: str) -> str:
+        contents = await self.accounts.mcp.read_resource(uri)
+        return list(contents)[0].content
+
+    async def get_account_report(self) -> str:
+        return await self.read_resource(f"accounts://compact/{self.name}")
+
+    async def get_strategy(self) -> str:
+        return await self.read_resource(f"accounts://strategy/{self.name}")
+
+
+def max_drawdown(values: list[float]) -> float:
+    peak, worst = 0.0, 0.0
+    for value in values:
+        peak = max(peak, value)
+        worst = max(worst, 1 - value / peak if peak else 0.0)
+    return worst
+
+
+async def replay(strategy: str, seed: int, prices: HistoricalPrices, dates: list[str], symbols: list[str]) -> dict:
+    import clock
+    import market
+    from accounts import Account, INITIAL_BALANCE
+
+    script = Script(strategy, seed, symbols)
+    model_name = f"scripted-{strategy}"
+    local_models[model_name] = lambda: ScriptedModel(script)
+    # Nothing leaves the machine: there are no traces to upload
+    set_tracing_disabled(True)
+    values = []
+    market.set_price_source(prices)
+    Account.get(ACCOUNT).reset(f"Backtest of the {strategy} strategy with seed {seed}")
+    accounts, market_server = InProcessMCPServer("accounts_server"), InProcessMCPServer("market_server")
+    async with accounts, market_server:
+        trader = BacktestTrader(model_name, accounts)
+        for day, date in enumerate(dates):
+            clock.set_time(datetime.fromisoformat(f"{date} {TRADING_TIME}"))
+            market.clear_price_cache()
+            script.day = day
+            await trader.run_agent([accounts, market_server], [])
+            trader.do_trade = not trader.do_trade
+            values.append(json.loads(Account.get(ACCOUNT).report())["total_portfolio_value"])
+    clock.set_time(None)
+    market.set_price_source(None)
+    account = Account.get(ACCOUNT)
+    return {
+        "strategy": strategy,
+        "seed": seed,
+        "days": len(dates),
+        "trades": len(account.transactions),
+        "final_value": values[-1] if values else account.balance,
+        "return": (values[-1] if values else account.balance) / INITIAL_BALANCE - 1,
+        "max_drawdown": max_drawdown(values),
+        "realized_pnl": account.realized_pnl,
+    }
+
+
+def run_backtest(job: dict) -> dict:
+    """Run one strategy and seed in this process, against a fresh accounts database of its own"""
+    import database
+    import accounts
+
+    symbols = job["symbols"]
+    if job.get("prices"):
+        prices = HistoricalPrices.from_file(job["prices"], symbols)
+    else:
+        prices = HistoricalPrices.from_database(symbols, job.get("start"), job.get("end"))
+    dates = prices.between(job.get("start"), job.get("end"))
+
+    os.makedirs(BACKTEST_DIR, exist_ok=True)
+    path = os.path.join(BACKTEST_DIR, f"{job['strategy']}-{job['seed']}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    database.DB = path
+    accounts._cache.clear()
+    result = asyncio.run(replay(job["strategy"], job["seed"], prices, dates, symbols))
+    database.close_connection()
+    return result
+
+
+def run_backtests(jobs: list[dict], workers: int | None = None) -> list[dict]:
+    """Run every job, spread across worker processes"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_backtest, jobs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--import", dest="import_path", help="store a CSV or Parquet price file in the market table and exit")
+    parser.add_argument("--prices", help="replay a CSV or Parquet file instead of the market table")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--symbols", default=",".join(DEFAULT_SYMBOLS))
+    parser.add_argument("--strategies", default=",".join(STRATEGIES))
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    if args.import_path:
+        import_prices(args.import_path)
+        return
+
+    jobs = [
+        {
+            "strategy": strategy,
+            "seed": seed,
+            "symbols": args.symbols.split(","),
+            "prices": args.prices,
+            "start": args.start,
+            "end": args.end,
+        }
+        for strategy in args.strategies.split(",")
+        for seed in range(args.seeds)
+    ]
+    results = run_backtests(jobs, args.workers)
+    print(f"{'strategy':<14} {'seed':>4} {'days':>5} {'trades':>6} {'final value':>12} {'return':>8} {'max dd':>7}")
+    for r in results:
+        print(
+            f"{r['strategy']:<14} {r['seed']:>4} {r['days']:>5} {r['trades']:>6} {r['final_value']:>12,.2f}"
+            f" {r['return']:>8.2%} {r['max_drawdown']:>7.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Measure the database and market load of dashboard sessions while a trader writes logs and trades:
+uv run bench_dashboard.py [seconds] [viewers ...]
+"polling" is what each session used to do by itself (logs every 0.5s, full refresh on a timer);
+"shared" is the read model, which does the work once and fans it out to every session.
+"""
+
+import asyncio
+import subprocess
+import sys
+import database
+import market
+
+BENCH_DB = "bench_dashboard.db"
+REFRESH_SECONDS = 2
+LOG_POLL_SECONDS = 0.5
+NAMES = ["Warren", "George", "Ray", "Cathie"]
+
+WRITER = f"""
+import time, database
+database.DB = {BENCH_DB!r}
+from accounts import Account
+from database import write_log
+deadline = time.monotonic() + float(__import__("sys").argv[1])
+while time.monotonic() < deadline:
+    for name in {NAMES!r}:
+        write_log(name, "trace", "thinking")
+    Account.get("Warren").buy_shares("AAPL", 1, "benchmark")
+    time.sleep(0.2)
+"""
+
+counts = {"queries": 0, "price_lookups": 0}
+
+
+def count_queries(path: str):
+    conn = connect(path)
+    conn.set_trace_callback(lambda statement: counts.__setitem__("queries", counts["queries"] + 1))
+    return conn
+
+
+def counting_prices(symbols: list[str]) -> dict[str, float]:
+    counts["price_lookups"] += 1
+    return {symbol: 100.0 for symbol in symbols}
+
+
+connect = database.connect
+database.connect = count_queries
+
+
+async def polling_session(traders, stop: asyncio.Event):
+    """One session doing its own reads, as every session did before the read model"""
+    states = {trader.name: (0, []) for trader in traders}
+
+    async def poll_logs():
+        while not stop.is_set():
+            for trader in traders:
+                last_id, lines = states[trader.name]
+                logs = await asyncio.to_thread(database.read_log_since, trader.name, last_id, 13)
+                if logs:
+                    states[trader.name] = logs[-1][0], trader.get_logs(lines, logs)[1]
+            await asyncio.sleep(LOG_POLL_SECONDS)
+
+    async def refresh():
+        while not stop.is_set():
+            for trader in traders:
+                await asyncio.to_thread(trader.render)
+            await asyncio.sleep(REFRESH_SECONDS)
+
+    await asyncio.gather(poll_logs(), refresh())
+
+
+async def shared_session(views, stop: asyncio.Event):
+    async def follow(view):
+        async for _ in view.stream():
+            if stop.is_set():
+                return
+
+    tasks = [asyncio.create_task(follow(view)) for view in views]
+    await stop.wait()
+    for task in tasks:
+        task.cancel()
+
+
+async def measure(mode: str, viewers: int, seconds: float) -> dict:
+    from app import Trader, TraderView
+    from read_model import ReadModel
+
+    traders = [Trader(name, "Trader", "model") for name in NAMES]
+    read_model = ReadModel(traders, refresh_seconds=REFRESH_SECONDS)
+    views = [TraderView(trader, read_model) for trader in traders]
+    writer = subprocess.Popen([sys.executable, "-c", WRITER, str(seconds)])
+    counts.update(queries=0, price_lookups=0)
+    market.clear_price_cache()
+    stop = asyncio.Event()
+    if mode == "polling":
+        sessions = [polling_session(traders, stop) for _ in range(viewers)]
+    else:
+        sessions = [shared_session(views, stop) for _ in range(viewers)]
+    tasks = [asyncio.create_task(session) for session in sessions]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    writer.wait()
+    read_model.stop()
+    return {"mode": mode, "viewers": viewers, "queries_per_s": counts["queries"] / seconds, **counts}
+
+
+async def main(seconds: float = 6, *viewer_counts: int):
+    database.DB = BENCH_DB
+    market.set_price_source(counting_prices)
+    # Price lookups are cached for a minute by default; expire them at the refresh rate so both modes really look up
+    market.PRICE_CACHE_TTL_SECONDS = REFRESH_SECONDS / 2
+    results = []
+    for viewers in viewer_counts or (1, 10, 50):
+        for mode in ("polling", "shared"):
+            results.append(await measure(mode, viewers, seconds))
+    print(f"{'mode':<8} {'viewers':>7} {'queries/s':>10} {'price lookups':>14}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['viewers']:>7} {r['queries_per_s']:>10,.0f} {r['price_lookups']:>14}")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 6
+    asyncio.run(main(seconds, *[int(arg) for arg in sys.argv[2:]]))
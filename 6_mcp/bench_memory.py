@@ -0,0 +1,104 @@
+"""
+Compare the memory servers a researcher can use: uv run bench_memory.py [entities] [searches]
+"npx" is mcp-memory-libsql, as launched before; "stdio" and "inprocess" are memory_server over each transport.
+Each gets a fresh database, and we time how long it takes to start and list its tools,
+then the latency of writing entities with relations and of searching them.
+"""
+
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from mcp_transports import create_mcp_server
+
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "JPM", "XOM", "UNH"]
+TOPICS = ["earnings", "guidance", "buyback", "dividend", "lawsuit", "upgrade", "downgrade", "merger", "outlook"]
+STARTUP_TIMEOUT_SECONDS = 120
+
+
+def percentiles(samples: list[float]) -> tuple[float, float]:
+    if len(samples) < 2:
+        return samples[0] * 1000, samples[0] * 1000
+    cuts = statistics.quantiles(samples, n=20)
+    return cuts[9] * 1000, cuts[18] * 1000
+
+
+def servers(directory: str) -> dict[str, dict]:
+    """The params for each server under test, each pointed at its own database in directory"""
+    memory_env = {**os.environ, "MEMORY_DB": os.path.join(directory, "native.db")}
+    params = {
+        "stdio": {"command": sys.executable, "args": ["memory_server.py"], "env": memory_env},
+        "inprocess": {"inprocess": "memory_server"},
+    }
+    if shutil.which("npx"):
+        params["npx"] = {
+            "command": "npx",
+            "args": ["-y", "mcp-memory-libsql"],
+            "env": {**os.environ, "LIBSQL_URL": f"file:{os.path.join(directory, 'libsql.db')}"},
+        }
+    return params
+
+
+def entities_batch(rng: random.Random, index: int) -> list[dict]:
+    symbol = SYMBOLS[index % len(SYMBOLS)]
+    return [
+        {
+            "name": f"{symbol}-note-{index}",
+            "entityType": "research",
+            "observations": [f"{symbol} {rng.choice(TOPICS)} {rng.choice(TOPICS)} noted in batch {index}"],
+        },
+        {"name": symbol, "entityType": "company", "observations": [f"{symbol} is tracked by the traders"]},
+    ]
+
+
+async def measure(label: str, params: dict, entities: int, searches: int) -> dict:
+    rng = random.Random(42)
+    server = create_mcp_server(params, client_session_timeout_seconds=STARTUP_TIMEOUT_SECONDS)
+    start = time.perf_counter()
+    await asyncio.wait_for(server.connect(), STARTUP_TIMEOUT_SECONDS)
+    await server.list_tools()
+    startup = time.perf_counter() - start
+    writes, reads = [], []
+    try:
+        for index in range(entities):
+            batch = entities_batch(rng, index)
+            start = time.perf_counter()
+            await server.call_tool("create_entities", {"entities": batch})
+            await server.call_tool(
+                "create_relations",
+                {"relations": [{"source": batch[0]["name"], "target": batch[1]["name"], "type": "about"}]},
+            )
+            writes.append(time.perf_counter() - start)
+        for _ in range(searches):
+            query = f"{rng.choice(SYMBOLS)} {rng.choice(TOPICS)}"
+            start = time.perf_counter()
+            await server.call_tool("search_nodes", {"query": query})
+            reads.append(time.perf_counter() - start)
+    finally:
+        await server.cleanup()
+    return {"server": label, "startup_s": startup, "write": percentiles(writes), "search": percentiles(reads)}
+
+
+async def main(entities: int = 200, searches: int = 200):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["MEMORY_DB"] = os.path.join(directory, "inprocess.db")
+        for label, params in servers(directory).items():
+            try:
+                results.append(await measure(label, params, entities, searches))
+            except Exception as e:
+                print(f"Could not benchmark {label}: {e!r}")
+    print(f"{'server':<10} {'startup s':>9} {'write p50':>10} {'write p95':>10} {'search p50':>11} {'search p95':>11}")
+    for r in results:
+        print(
+            f"{r['server']:<10} {r['startup_s']:>9.2f} {r['write'][0]:>8.2f}ms {r['write'][1]:>8.2f}ms "
+            f"{r['search'][0]:>9.2f}ms {r['search'][1]:>9.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:]]))
@@ -0,0 +1,77 @@
+"""
+Compare the latency of reaching the accounts server over each MCP transport: uv run bench_transports.py [calls]
+"""
+
+import asyncio
+import subprocess
+import sys
+import time
+from accounts import Account
+from mcp_params import local_mcp
+from mcp_transports import create_mcp_server
+
+TRANSPORTS = ["stdio", "sse", "inprocess"]
+ACCOUNT = "benchmark"
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+async def wait_for_http(params: dict, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with create_mcp_server(params):
+                return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def bench(transport: str, calls: int) -> dict:
+    params = local_mcp("accounts_server", transport)
+    start = time.perf_counter()
+    async with create_mcp_server(params) as server:
+        await server.list_tools()
+        startup = time.perf_counter() - start
+
+        latencies = []
+        for _ in range(calls):
+            call_start = time.perf_counter()
+            await server.call_tool("get_balance", {"name": ACCOUNT})
+            latencies.append(time.perf_counter() - call_start)
+
+        concurrent_start = time.perf_counter()
+        await asyncio.gather(*[server.call_tool("get_balance", {"name": ACCOUNT}) for _ in range(calls)])
+        concurrent = time.perf_counter() - concurrent_start
+
+    return {
+        "transport": transport,
+        "startup_ms": startup * 1000,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "concurrent_calls_per_s": calls / concurrent,
+    }
+
+
+async def main(calls: int = 200) -> None:
+    Account.get(ACCOUNT)
+    http_server = subprocess.Popen([sys.executable, "mcp_http.py"])
+    try:
+        await wait_for_http(local_mcp("accounts_server", "sse"))
+        results = [await bench(transport, calls) for transport in TRANSPORTS]
+    finally:
+        http_server.terminate()
+    print(f"{'transport':<10} {'startup ms':>11} {'p50 ms':>8} {'p95 ms':>8} {'concurrent calls/s':>19}")
+    for r in results:
+        print(
+            f"{r['transport']:<10} {r['startup_ms']:>11.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}"
+            f" {r['concurrent_calls_per_s']:>19,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:]]))
@@ -0,0 +1,15 @@
+from datetime import datetime
+
+# Set by a backtest so that trades, snapshots and prompts are stamped with the simulated time
+_simulated: datetime | None = None
+
+
+def now() -> datetime:
+    """The current time: the simulated time during a backtest, otherwise the real one"""
+    return _simulated or datetime.now()
+
+
+def set_time(when: datetime | None) -> None:
+    """Move the simulated clock to when, or pass None to go back to the real time"""
+    global _simulated
+    _simulated = when
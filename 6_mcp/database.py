@@ -1,101 +1,691 @@
 import sqlite3
 import json
-from datetime import datetime
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
 DB = "accounts.db"
 
+# Connection tuning: WAL lets the dashboard read while traders write, NORMAL sync is safe under WAL,
+# and the busy timeout makes writers queue for the lock instead of failing with "database is locked"
+BUSY_TIMEOUT_MS = 10_000
+CACHED_STATEMENTS = 256
 
-with sqlite3.connect(DB) as conn:
-    cursor = conn.cursor()
-    cursor.execute('CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            datetime DATETIME,
-            type TEXT,
-            message TEXT
+# How many of the latest portfolio snapshots an account carries; the chart reads the full history downsampled
+RECENT_SNAPSHOTS = 100
+
+# Each entry upgrades the schema by one version; PRAGMA user_version records how far a database has got
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT);
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        datetime DATETIME,
+        type TEXT,
+        message TEXT
+    );
+    CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT);
+    """,
+    lambda conn: normalize_accounts(conn),
+    "CREATE INDEX IF NOT EXISTS logs_name_id ON logs (name, id)",
+    """
+    CREATE INDEX IF NOT EXISTS logs_type_datetime ON logs (type, datetime);
+    CREATE TABLE IF NOT EXISTS log_rollups (
+        name TEXT NOT NULL,
+        hour TEXT NOT NULL,
+        type TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        first_id INTEGER NOT NULL,
+        last_id INTEGER NOT NULL,
+        PRIMARY KEY (name, hour, type)
+    );
+    """,
+    "ALTER TABLE accounts ADD COLUMN version INTEGER NOT NULL DEFAULT 0",
+    lambda conn: add_running_totals(conn),
+    lambda conn: split_market(conn),
+    "CREATE INDEX IF NOT EXISTS portfolio_snapshots_name_datetime ON portfolio_snapshots (name, datetime, value)",
+    """
+    CREATE TABLE IF NOT EXISTS spans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        trace_id TEXT NOT NULL,
+        span_id TEXT NOT NULL,
+        parent_id TEXT,
+        name TEXT,
+        type TEXT NOT NULL,
+        tool TEXT,
+        server TEXT,
+        model TEXT,
+        started_at TEXT NOT NULL,
+        ended_at TEXT NOT NULL,
+        duration_ms REAL NOT NULL,
+        input_tokens INTEGER,
+        output_tokens INTEGER,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS spans_started_at ON spans (started_at);
+    CREATE INDEX IF NOT EXISTS spans_tool ON spans (tool, started_at, duration_ms) WHERE tool IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS spans_server ON spans (server, started_at, duration_ms) WHERE server IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS spans_model ON spans (model, started_at, duration_ms) WHERE model IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS spans_trace_id ON spans (trace_id);
+    """,
+    lambda conn: key_market_by_trading_date(conn),
+]
+
+ACCOUNT_TABLES = """
+    CREATE TABLE IF NOT EXISTS accounts (
+        name TEXT PRIMARY KEY,
+        balance REAL NOT NULL,
+        strategy TEXT NOT NULL DEFAULT ''
+    );
+    CREATE TABLE IF NOT EXISTS holdings (
+        name TEXT NOT NULL REFERENCES accounts(name) ON DELETE CASCADE,
+        symbol TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        PRIMARY KEY (name, symbol)
+    );
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL REFERENCES accounts(name) ON DELETE CASCADE,
+        symbol TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        price REAL NOT NULL,
+        timestamp TEXT NOT NULL,
+        rationale TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS transactions_name_id ON transactions (name, id);
+    CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL REFERENCES accounts(name) ON DELETE CASCADE,
+        datetime TEXT NOT NULL,
+        value REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS portfolio_snapshots_name_id ON portfolio_snapshots (name, id)
+"""
+
+
+class StaleAccountError(Exception):
+    """Raised when writing an account that another connection has changed since it was read."""
+
+
+_local = threading.local()
+_migrate_lock = threading.Lock()
+_migrated = set()
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a tuned connection to the given database file and bring its schema up to date."""
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=CACHED_STATEMENTS,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys=ON")
+    migrate(conn, path)
+    return conn
+
+
+def migrate(conn: sqlite3.Connection, path: str = DB) -> None:
+    """Apply any outstanding migrations, once per database per process."""
+    if path in _migrated:
+        return
+    with _migrate_lock:
+        if path in _migrated:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                if callable(migration):
+                    migration(conn)
+                else:
+                    for statement in migration.split(";"):
+                        if statement.strip():
+                            conn.execute(statement)
+                conn.execute(f"PRAGMA user_version={number}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        _migrated.add(path)
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's connection to DB, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != DB:
+        if conn is not None:
+            conn.close()
+        conn = connect(DB)
+        _local.conn = conn
+        _local.path = DB
+    return conn
+
+
+@contextmanager
+def transaction(immediate: bool = False):
+    """Run a block of statements in a single transaction on this thread's connection."""
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        # Also when COMMIT itself fails, e.g. with SQLITE_BUSY: left open, the transaction would swallow every later one
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+
+def close_connection() -> None:
+    """Close this thread's connection, if it has one."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def normalize_accounts(conn: sqlite3.Connection) -> None:
+    """Convert the legacy one-JSON-blob-per-account table into the normalized account tables."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(accounts)")]
+    legacy = "account" in columns
+    if legacy:
+        conn.execute("ALTER TABLE accounts RENAME TO accounts_legacy")
+    for statement in ACCOUNT_TABLES.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+    if not legacy:
+        return
+    for name, account_json in conn.execute("SELECT name, account FROM accounts_legacy").fetchall():
+        account = json.loads(account_json)
+        conn.execute(
+            "INSERT INTO accounts (name, balance, strategy) VALUES (?, ?, ?)",
+            (name, account["balance"], account["strategy"]),
+        )
+        conn.executemany(
+            "INSERT INTO holdings (name, symbol, quantity) VALUES (?, ?, ?)",
+            [(name, symbol, quantity) for symbol, quantity in account["holdings"].items()],
+        )
+        conn.executemany(
+            "INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (name, t["symbol"], t["quantity"], t["price"], t["timestamp"], t["rationale"])
+                for t in account["transactions"]
+            ],
         )
+        conn.executemany(
+            "INSERT INTO portfolio_snapshots (name, datetime, value) VALUES (?, ?, ?)",
+            [(name, dt, value) for dt, value in account["portfolio_value_time_series"]],
+        )
+    conn.execute("DROP TABLE accounts_legacy")
+
+
+def add_running_totals(conn: sqlite3.Connection) -> None:
+    """Add the running cost basis, net invested and realized P&L columns, backfilled by replaying each account's trades."""
+    conn.execute("ALTER TABLE accounts ADD COLUMN net_invested REAL NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE accounts ADD COLUMN realized_pnl REAL NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE holdings ADD COLUMN cost_basis REAL NOT NULL DEFAULT 0")
+    for (name,) in conn.execute("SELECT name FROM accounts").fetchall():
+        net_invested, realized_pnl, quantities, costs = 0.0, 0.0, {}, {}
+        trades = conn.execute("SELECT symbol, quantity, price FROM transactions WHERE name = ? ORDER BY id", (name,))
+        for symbol, quantity, price in trades.fetchall():
+            net_invested += quantity * price
+            held = quantities.get(symbol, 0)
+            if quantity > 0:
+                costs[symbol] = costs.get(symbol, 0.0) + quantity * price
+            elif held:
+                cost_sold = costs.get(symbol, 0.0) * -quantity / held
+                realized_pnl += -quantity * price - cost_sold
+                costs[symbol] = costs.get(symbol, 0.0) - cost_sold
+            quantities[symbol] = held + quantity
+        conn.execute(
+            "UPDATE accounts SET net_invested = ?, realized_pnl = ? WHERE name = ?", (net_invested, realized_pnl, name)
+        )
+        conn.executemany(
+            "UPDATE holdings SET cost_basis = ? WHERE name = ? AND symbol = ?",
+            [(cost, name, symbol) for symbol, cost in costs.items()],
+        )
+
+
+def split_market(conn: sqlite3.Connection) -> None:
+    """Replace the one-JSON-blob-per-date market table with one indexed row per date and ticker."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS market_dates (
+            date TEXT PRIMARY KEY,
+            trading_date TEXT,
+            tickers INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS market_prices (
+            date TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            close REAL NOT NULL,
+            PRIMARY KEY (date, ticker)
+        ) WITHOUT ROWID
     ''')
-    cursor.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
-    conn.commit()
-
-def write_account(name, account_dict):
-    json_data = json.dumps(account_dict)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO accounts (name, account)
-            VALUES (?, ?)
-            ON CONFLICT(name) DO UPDATE SET account=excluded.account
-        ''', (name.lower(), json_data))
-        conn.commit()
-
-def read_account(name):
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT account FROM accounts WHERE name = ?', (name.lower(),))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
-    
+    conn.execute("CREATE INDEX IF NOT EXISTS market_prices_ticker_date ON market_prices (ticker, date)")
+    for date, data in conn.execute("SELECT date, data FROM market").fetchall():
+        _write_market(conn, date, json.loads(data), None)
+    conn.execute("DROP TABLE market")
+
+
+def key_market_by_trading_date(conn: sqlite3.Connection) -> None:
+    """
+    Re-key the stored closes by the trading day they are from rather than the day they were looked up,
+    keeping one row per session and ticker; market_dates still maps each lookup day to its trading day.
+    """
+    conn.execute("UPDATE market_dates SET trading_date = date WHERE trading_date IS NULL")
+    conn.execute('''
+        CREATE TABLE market_sessions (
+            date TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            close REAL NOT NULL,
+            PRIMARY KEY (date, ticker)
+        ) WITHOUT ROWID
+    ''')
+    # Where several lookup days map to one session, the latest download wins
+    conn.execute('''
+        INSERT OR REPLACE INTO market_sessions (date, ticker, close)
+        SELECT market_dates.trading_date, market_prices.ticker, market_prices.close
+        FROM market_dates JOIN market_prices ON market_prices.date = market_dates.date
+        ORDER BY market_dates.date
+    ''')
+    conn.execute("DROP TABLE market_prices")
+    conn.execute("ALTER TABLE market_sessions RENAME TO market_prices")
+    conn.execute("CREATE INDEX IF NOT EXISTS market_prices_ticker_date ON market_prices (ticker, date)")
+
+
+def _write_account(conn, name, balance, strategy, holdings, cost_basis, net_invested, realized_pnl):
+    conn.execute('''
+        INSERT INTO accounts (name, balance, strategy, net_invested, realized_pnl)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            balance=excluded.balance,
+            strategy=excluded.strategy,
+            net_invested=excluded.net_invested,
+            realized_pnl=excluded.realized_pnl
+    ''', (name, balance, strategy, net_invested, realized_pnl))
+    conn.execute('DELETE FROM holdings WHERE name = ?', (name,))
+    conn.executemany(
+        'INSERT INTO holdings (name, symbol, quantity, cost_basis) VALUES (?, ?, ?, ?)',
+        [(name, symbol, quantity, cost_basis.get(symbol, 0.0)) for symbol, quantity in holdings.items()],
+    )
+
+def _bump_version(conn, name) -> int:
+    conn.execute('UPDATE accounts SET version = version + 1 WHERE name = ?', (name,))
+    return conn.execute('SELECT version FROM accounts WHERE name = ?', (name,)).fetchone()[0]
+
+def write_account(
+    name: str,
+    balance: float,
+    strategy: str,
+    holdings: dict[str, int],
+    cost_basis: dict[str, float] | None = None,
+    net_invested: float = 0.0,
+    realized_pnl: float = 0.0,
+) -> int:
+    """
+    Write the mutable state of an account: its balance, strategy, current holdings and their cost basis,
+    and the running totals of cash invested and realized profit. Returns the new version.
+    """
+    name = name.lower()
+    with transaction() as conn:
+        _write_account(conn, name, balance, strategy, holdings, cost_basis or {}, net_invested, realized_pnl)
+        return _bump_version(conn, name)
+
+def read_account_version(name: str) -> int | None:
+    """Return the account's version, which changes on every write to the account, or None if there is no account."""
+    row = get_connection().execute('SELECT version FROM accounts WHERE name = ?', (name.lower(),)).fetchone()
+    return row[0] if row else None
+
+def read_account(name: str) -> dict | None:
+    """Assemble an account, with its holdings, transactions, recent portfolio history and version, from the account tables."""
+    name = name.lower()
+    with transaction() as conn:
+        row = conn.execute(
+            'SELECT balance, strategy, version, net_invested, realized_pnl FROM accounts WHERE name = ?', (name,)
+        ).fetchone()
+        if not row:
+            return None
+        holdings = conn.execute(
+            'SELECT symbol, quantity, cost_basis FROM holdings WHERE name = ? ORDER BY rowid', (name,)
+        ).fetchall()
+        transactions = conn.execute('''
+            SELECT symbol, quantity, price, timestamp, rationale FROM transactions
+            WHERE name = ?
+            ORDER BY id
+        ''', (name,)).fetchall()
+        snapshots = conn.execute(
+            'SELECT datetime, value FROM portfolio_snapshots WHERE name = ? ORDER BY id DESC LIMIT ?',
+            (name, RECENT_SNAPSHOTS),
+        ).fetchall()
+        snapshots.reverse()
+    return {
+        "name": name,
+        "balance": row[0],
+        "strategy": row[1],
+        "version": row[2],
+        "net_invested": row[3],
+        "realized_pnl": row[4],
+        "holdings": {symbol: quantity for symbol, quantity, _ in holdings},
+        "cost_basis": {symbol: cost_basis for symbol, _, cost_basis in holdings},
+        "transactions": [
+            {"symbol": symbol, "quantity": quantity, "price": price, "timestamp": timestamp, "rationale": rationale}
+            for symbol, quantity, price, timestamp, rationale in transactions
+        ],
+        "portfolio_value_time_series": [tuple(snapshot) for snapshot in snapshots],
+    }
+
+def write_transaction(name: str, transaction_dict: dict) -> int:
+    """Append a transaction to the account's history. Returns the account's new version."""
+    name = name.lower()
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (
+            name,
+            transaction_dict["symbol"],
+            transaction_dict["quantity"],
+            transaction_dict["price"],
+            transaction_dict["timestamp"],
+            transaction_dict["rationale"],
+        ))
+        return _bump_version(conn, name)
+
+def write_transactions(name: str, transaction_dicts: list[dict]) -> int:
+    """Append several transactions to the account's history at once. Returns the account's new version."""
+    name = name.lower()
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (name, t["symbol"], t["quantity"], t["price"], t["timestamp"], t["rationale"])
+            for t in transaction_dicts
+        ])
+        return _bump_version(conn, name)
+
+def write_portfolio_snapshot(name: str, datetime: str, value: float) -> int:
+    """Append a point to the account's portfolio value time series. Returns the account's new version."""
+    name = name.lower()
+    with transaction() as conn:
+        conn.execute(
+            'INSERT INTO portfolio_snapshots (name, datetime, value) VALUES (?, ?, ?)',
+            (name, datetime, value),
+        )
+        return _bump_version(conn, name)
+
+def read_portfolio_series(name: str, max_points: int = 500) -> list[tuple[str, float, float, float, float]]:
+    """
+    Read an account's portfolio value history downsampled to at most max_points time buckets of equal width.
+    Returns tuples of (datetime, open, high, low, close), oldest first, where datetime is the last snapshot in the bucket;
+    if the history already fits, every snapshot is returned as its own bucket.
+    """
+    name = name.lower()
+    with transaction() as conn:
+        count = conn.execute('SELECT COUNT(*) FROM portfolio_snapshots WHERE name = ?', (name,)).fetchone()[0]
+        if count <= max_points:
+            rows = conn.execute(
+                'SELECT datetime, value FROM portfolio_snapshots WHERE name = ? ORDER BY datetime, id', (name,)
+            ).fetchall()
+            return [(dt, value, value, value, value) for dt, value in rows]
+        return conn.execute('''
+            WITH bounds AS (
+                SELECT julianday(MIN(datetime)) AS start,
+                       (julianday(MAX(datetime)) - julianday(MIN(datetime))) / ? AS width
+                FROM portfolio_snapshots WHERE name = ?
+            ),
+            bucketed AS (
+                SELECT MIN(CAST((julianday(datetime) - start) / width AS INTEGER), ? - 1) AS bucket,
+                       id, datetime, value
+                FROM portfolio_snapshots, bounds
+                WHERE name = ?
+            ),
+            ranked AS (
+                SELECT bucket, datetime, value,
+                       FIRST_VALUE(value) OVER w AS open,
+                       LAST_VALUE(value) OVER w AS close
+                FROM bucketed
+                WINDOW w AS (PARTITION BY bucket ORDER BY datetime, id ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+            )
+            SELECT MAX(datetime), open, MAX(value), MIN(value), close
+            FROM ranked
+            GROUP BY bucket
+            ORDER BY bucket
+        ''', (max_points, name, max_points, name)).fetchall()
+
+def clear_account_history(name: str) -> None:
+    """Delete the holdings, transactions and portfolio history of an account."""
+    name = name.lower()
+    with transaction() as conn:
+        conn.execute('DELETE FROM holdings WHERE name = ?', (name,))
+        conn.execute('DELETE FROM transactions WHERE name = ?', (name,))
+        conn.execute('DELETE FROM portfolio_snapshots WHERE name = ?', (name,))
+        _bump_version(conn, name)
+
+@contextmanager
+def account_transaction(name: str, expected_version: int | None):
+    """
+    Run a block of account writes as one BEGIN IMMEDIATE transaction, first checking that the account
+    is still at expected_version (unless it's None); raises StaleAccountError if another writer got there first.
+    """
+    conn = get_connection()
+    outermost = not conn.in_transaction
+    with transaction(immediate=True) as conn:
+        if outermost and expected_version is not None:
+            version = read_account_version(name)
+            if version is not None and version != expected_version:
+                raise StaleAccountError(f"Account {name} is at version {version}, expected {expected_version}")
+        yield conn
+
 def write_log(name: str, type: str, message: str):
     """
     Write a log entry to the logs table.
-    
+
     Args:
         name (str): The name associated with the log
         type (str): The type of log entry
         message (str): The log message
     """
-    now = datetime.now().isoformat()
-    
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    get_connection().execute('''
+        INSERT INTO logs (name, datetime, type, message)
+        VALUES (?, datetime('now'), ?, ?)
+    ''', (name.lower(), type, message))
+
+def write_logs(entries: list[tuple[str, str, str, str]]) -> None:
+    """
+    Write a batch of log entries to the logs table in a single transaction.
+
+    Args:
+        entries (list): Tuples of (name, datetime, type, message)
+    """
+    with transaction() as conn:
+        conn.executemany('''
             INSERT INTO logs (name, datetime, type, message)
-            VALUES (?, datetime('now'), ?, ?)
-        ''', (name.lower(), type, message))
-        conn.commit()
+            VALUES (?, ?, ?, ?)
+        ''', [(name.lower(), dt, type, message) for name, dt, type, message in entries])
 
 def read_log(name: str, last_n=10):
     """
     Read the most recent log entries for a given name.
-    
+
     Args:
         name (str): The name to retrieve logs for
         last_n (int): Number of most recent entries to retrieve
-        
+
     Returns:
         list: A list of tuples containing (datetime, type, message)
     """
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT datetime, type, message FROM logs 
-            WHERE name = ? 
-            ORDER BY datetime DESC
-            LIMIT ?
-        ''', (name.lower(), last_n))
-        
-        return reversed(cursor.fetchall())
-
-def write_market(date: str, data: dict) -> None:
-    data_json = json.dumps(data)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO market (date, data)
-            VALUES (?, ?)
-            ON CONFLICT(date) DO UPDATE SET data=excluded.data
-        ''', (date, data_json))
-        conn.commit()
+    rows = get_connection().execute('''
+        SELECT datetime, type, message FROM logs
+        WHERE name = ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), last_n)).fetchall()
+    return reversed(rows)
+
+def read_log_since(name: str, last_id: int = 0, limit: int = 10) -> list[tuple[int, str, str, str]]:
+    """
+    Read the log entries for a given name that were written after last_id.
+
+    Args:
+        name (str): The name to retrieve logs for
+        last_id (int): The id of the last entry already seen; 0 to start from the most recent entries
+        limit (int): Maximum number of entries to retrieve; if there are more, the most recent are kept
+
+    Returns:
+        list: A list of tuples containing (id, datetime, type, message), oldest first
+    """
+    rows = get_connection().execute('''
+        SELECT id, datetime, type, message FROM logs
+        WHERE name = ? AND id > ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), last_id, limit)).fetchall()
+    rows.reverse()
+    return rows
+
+SPAN_COLUMNS = (
+    "trace_id", "span_id", "parent_id", "name", "type", "tool", "server", "model",
+    "started_at", "ended_at", "duration_ms", "input_tokens", "output_tokens", "error",
+)
+
+# What read_span_stats can group by: the tool called, the MCP server that served it, or the model
+SPAN_GROUPS = ("tool", "server", "model")
+
+def write_spans(entries: list[tuple]) -> None:
+    """
+    Write a batch of finished spans to the spans table in a single transaction.
+
+    Args:
+        entries (list): Tuples with a value for each of SPAN_COLUMNS, in that order
+    """
+    placeholders = ",".join("?" * len(SPAN_COLUMNS))
+    with transaction() as conn:
+        conn.executemany(f'''
+            INSERT INTO spans ({", ".join(SPAN_COLUMNS)}) VALUES ({placeholders})
+        ''', entries)
+
+def read_span_stats(group: str, since: str = "") -> list[tuple]:
+    """
+    Summarize the spans started since a time, per tool, MCP server or model.
+    Percentiles are nearest-rank: the smallest duration at least that fraction of the calls took no longer than.
+
+    Args:
+        group (str): One of SPAN_GROUPS
+        since (str): A UTC datetime like '2025-01-31 09:00:00'; empty for every span
+
+    Returns:
+        list: Tuples of (key, calls, errors, p50_ms, p95_ms, max_ms, input_tokens, output_tokens), slowest p95 first
+    """
+    if group not in SPAN_GROUPS:
+        raise ValueError(f"Can't group spans by {group}; choose one of {', '.join(SPAN_GROUPS)}")
+    rows = get_connection().execute(f'''
+        WITH ranked AS (
+            SELECT {group} AS key, duration_ms, error, input_tokens, output_tokens,
+                ROW_NUMBER() OVER (PARTITION BY {group} ORDER BY duration_ms) AS position,
+                COUNT(*) OVER (PARTITION BY {group}) AS calls
+            FROM spans
+            WHERE {group} IS NOT NULL AND started_at >= ?
+        )
+        SELECT key, calls, SUM(error IS NOT NULL),
+            MIN(CASE WHEN position >= 0.50 * calls THEN duration_ms END),
+            MIN(CASE WHEN position >= 0.95 * calls THEN duration_ms END),
+            MAX(duration_ms), SUM(input_tokens), SUM(output_tokens)
+        FROM ranked
+        GROUP BY key
+        ORDER BY 5 DESC
+    ''', (since,))
+    return rows.fetchall()
+
+def _write_market(conn, date, data, trading_date):
+    trading_date = trading_date or date
+    rows = [(trading_date, ticker, close) for ticker, close in data.items() if close is not None]
+    conn.execute('''
+        INSERT INTO market_dates (date, trading_date, tickers)
+        VALUES (?, ?, ?)
+        ON CONFLICT(date) DO UPDATE SET trading_date=excluded.trading_date, tickers=excluded.tickers
+    ''', (date, trading_date, len(rows)))
+    conn.executemany('''
+        INSERT INTO market_prices (date, ticker, close)
+        VALUES (?, ?, ?)
+        ON CONFLICT(date, ticker) DO UPDATE SET close=excluded.close
+    ''', rows)
+
+def write_market(date: str, data: dict, trading_date: str | None = None) -> None:
+    """
+    Store the closing price of every ticker under the trading day they are from, and record that a lookup
+    on date resolves to that trading day. Lookup days that share a session, like a weekend, share its rows.
+    """
+    with transaction() as conn:
+        _write_market(conn, date, data, trading_date)
+
+def has_market(date: str) -> bool:
+    """Whether the closing prices for a date have been stored."""
+    return _trading_date(date) is not None
+
+def _trading_date(date: str) -> str | None:
+    """The trading day whose closes a lookup on date resolves to, if they have been stored."""
+    row = get_connection().execute('SELECT trading_date FROM market_dates WHERE date = ?', (date,)).fetchone()
+    return row[0] if row else None
+
+def read_market_prices(date: str, symbols: list[str]) -> dict[str, float] | None:
+    """
+    Read the stored closing prices of some symbols for a date, one indexed lookup per symbol.
+    Returns None if nothing is stored for the date; symbols without a price are left out.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    prices = {}
+    with transaction() as conn:
+        trading_date = _trading_date(date)
+        if trading_date is None:
+            return None
+        for start in range(0, len(symbols), 500):
+            chunk = symbols[start:start + 500]
+            rows = conn.execute(
+                f'SELECT ticker, close FROM market_prices WHERE date = ? AND ticker IN ({",".join("?" * len(chunk))})',
+                (trading_date, *chunk),
+            )
+            prices.update(rows.fetchall())
+    return prices
 
 def read_market(date: str) -> dict | None:
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT data FROM market WHERE date = ?', (date,))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
\ No newline at end of file
+    """Read the closing price of every ticker stored for a date."""
+    with transaction() as conn:
+        trading_date = _trading_date(date)
+        if trading_date is None:
+            return None
+        return dict(conn.execute('SELECT ticker, close FROM market_prices WHERE date = ?', (trading_date,)).fetchall())
+
+def read_market_dates() -> list[tuple[str, str | None, int]]:
+    """List the stored dates, oldest first, as tuples of (date, trading_date, number of tickers)."""
+    return get_connection().execute('SELECT date, trading_date, tickers FROM market_dates ORDER BY date').fetchall()
+
+def read_price_history(symbol: str, start: str | None = None, end: str | None = None) -> list[tuple[str, float]]:
+    """Read the stored closing prices of one symbol over a range of trading days, one per session, as (date, close) tuples."""
+    rows = get_connection().execute('''
+        SELECT date, close FROM market_prices
+        WHERE ticker = ? AND date >= ? AND date <= ?
+        ORDER BY date
+    ''', (symbol, start or "", end or "9999-12-31"))
+    return rows.fetchall()
+
+if __name__ == "__main__":
+    # Convert existing database files to the current schema: uv run database.py [path ...]
+    import sys
+
+    for path in sys.argv[1:] or [DB]:
+        connect(path).close()
+        print(f"Migrated {path}")
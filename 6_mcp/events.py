@@ -0,0 +1,129 @@
+"""
+Pushes changes to the traders' logs and accounts to dashboard sessions as they happen.
+The traders write from other processes, so one watcher thread per process checks PRAGMA data_version,
+which changes only when another connection commits and costs no table reads. When it changes, the watcher
+reads just the new log rows and the account versions once, and fans them out to every subscriber.
+The watcher runs only while someone is subscribed.
+"""
+
+import asyncio
+import threading
+import time
+from typing import NamedTuple
+import database
+
+WATCH_INTERVAL_SECONDS = 0.25
+
+
+class Event(NamedTuple):
+    kind: str  # "log" or "account"
+    name: str
+    data: object  # the new (id, datetime, type, message) log rows, or the account's new version
+
+
+class EventBus:
+    def __init__(self, interval: float = WATCH_INTERVAL_SECONDS):
+        self.interval = interval
+        self.subscribers: dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+        self.polls = 0
+        self.changes = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._watching = threading.Event()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        with self._lock:
+            self.subscribers[queue] = asyncio.get_running_loop()
+            if not self._thread or not self._thread.is_alive():
+                self._watching.clear()
+                self._thread = threading.Thread(target=self._watch, daemon=True)
+                self._thread.start()
+        return queue
+
+    def wait_until_watching(self, timeout: float | None = None) -> bool:
+        """Block until the watcher has noted where it starts from; anything written after that is published"""
+        return self._watching.wait(timeout)
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self.subscribers.pop(queue, None)
+
+    async def events(self, name: str | None = None):
+        """Yield every event, or only those for the named account, until the caller stops listening"""
+        queue = self.subscribe()
+        try:
+            while True:
+                event = await queue.get()
+                if name is None or event.name == name.lower():
+                    yield event
+        finally:
+            self.unsubscribe(queue)
+
+    def publish(self, event: Event) -> None:
+        with self._lock:
+            subscribers = list(self.subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # That session's event loop has closed
+                self.unsubscribe(queue)
+
+    def _watch(self):
+        conn = None
+        last_id = versions = data_version = None
+        try:
+            while True:
+                with self._lock:
+                    if not self.subscribers:
+                        self._thread = None
+                        return
+                try:
+                    if conn is None:
+                        conn = database.connect(database.DB)
+                        data_version = None
+                        if last_id is None:
+                            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM logs").fetchone()[0]
+                            versions = dict(conn.execute("SELECT name, version FROM accounts").fetchall())
+                            self._watching.set()
+                    self.polls += 1
+                    current = conn.execute("PRAGMA data_version").fetchone()[0]
+                    if current != data_version:
+                        last_id, versions = self._publish_changes(conn, last_id, versions)
+                        data_version = current
+                except Exception as e:
+                    # A locked or closed database mustn't end the watcher; reconnect and carry on from the last event
+                    self.errors += 1
+                    print(f"Event watcher could not read the database ({e!r}); retrying")
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+                time.sleep(self.interval)
+        finally:
+            if conn is not None:
+                conn.close()
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _publish_changes(self, conn, last_id: int, versions: dict) -> tuple[int, dict]:
+        self.changes += 1
+        rows = conn.execute(
+            "SELECT id, name, datetime, type, message FROM logs WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+        by_name: dict[str, list] = {}
+        for id, name, dt, type, message in rows:
+            by_name.setdefault(name, []).append((id, dt, type, message))
+            last_id = id
+        for name, entries in by_name.items():
+            self.publish(Event("log", name, entries))
+        current = dict(conn.execute("SELECT name, version FROM accounts").fetchall())
+        for name, version in current.items():
+            if versions.get(name) != version:
+                self.publish(Event("account", name, version))
+        return last_id, current
+
+
+bus = EventBus()
@@ -0,0 +1,245 @@
+import sqlite3
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+# One knowledge graph shared by every trader
+MEMORY_DB = os.getenv("MEMORY_DB", "memory/memory.db")
+SEARCH_LIMIT = 20
+READ_GRAPH_LIMIT = 50
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entities (
+        name TEXT PRIMARY KEY,
+        entity_type TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now')),
+        updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE INDEX IF NOT EXISTS entities_updated_at ON entities (updated_at);
+    CREATE TABLE IF NOT EXISTS observations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity_name TEXT NOT NULL REFERENCES entities(name) ON DELETE CASCADE,
+        content TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now')),
+        UNIQUE (entity_name, content)
+    );
+    CREATE TABLE IF NOT EXISTS relations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source TEXT NOT NULL REFERENCES entities(name) ON DELETE CASCADE,
+        target TEXT NOT NULL REFERENCES entities(name) ON DELETE CASCADE,
+        relation_type TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (datetime('now')),
+        UNIQUE (source, target, relation_type)
+    );
+    CREATE INDEX IF NOT EXISTS relations_target ON relations (target);
+    CREATE VIRTUAL TABLE IF NOT EXISTS entities_fts USING fts5(name, entity_type, content='entities');
+    CREATE VIRTUAL TABLE IF NOT EXISTS observations_fts USING fts5(content, content='observations', content_rowid='id');
+    CREATE TRIGGER IF NOT EXISTS entities_ai AFTER INSERT ON entities BEGIN
+        INSERT INTO entities_fts (rowid, name, entity_type) VALUES (new.rowid, new.name, new.entity_type);
+    END;
+    CREATE TRIGGER IF NOT EXISTS entities_ad AFTER DELETE ON entities BEGIN
+        INSERT INTO entities_fts (entities_fts, rowid, name, entity_type) VALUES ('delete', old.rowid, old.name, old.entity_type);
+    END;
+    CREATE TRIGGER IF NOT EXISTS entities_au AFTER UPDATE OF name, entity_type ON entities BEGIN
+        INSERT INTO entities_fts (entities_fts, rowid, name, entity_type) VALUES ('delete', old.rowid, old.name, old.entity_type);
+        INSERT INTO entities_fts (rowid, name, entity_type) VALUES (new.rowid, new.name, new.entity_type);
+    END;
+    CREATE TRIGGER IF NOT EXISTS observations_ai AFTER INSERT ON observations BEGIN
+        INSERT INTO observations_fts (rowid, content) VALUES (new.id, new.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS observations_ad AFTER DELETE ON observations BEGIN
+        INSERT INTO observations_fts (observations_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+"""
+
+
+def fts_query(query: str) -> str:
+    """Turn free text into an FTS5 query matching any of its words as a prefix, with the words quoted so none is an operator"""
+    words = [word.replace('"', '""') for word in query.split()]
+    return " OR ".join(f'"{word}"*' for word in words)
+
+
+class KnowledgeGraph:
+    """
+    Entities with observations, and typed relations between them, in SQLite.
+    Searches use FTS5 indexes over entity names, types and observations, ranked by relevance,
+    and the time spent on each kind of operation is recorded so its cost can be watched.
+    """
+
+    def __init__(self, path: str = MEMORY_DB):
+        self.path = path
+        self._local = threading.local()
+        self.timings = defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection().executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            # Also when COMMIT itself fails, so the connection isn't left inside the transaction
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    @contextmanager
+    def timed(self, operation: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timing = self.timings[operation]
+            timing["calls"] += 1
+            timing["seconds"] += time.perf_counter() - start
+
+    def stats(self) -> dict:
+        return {
+            operation: {**timing, "mean_ms": timing["seconds"] / timing["calls"] * 1000}
+            for operation, timing in self.timings.items()
+        }
+
+    def create_entities(self, entities: list[dict]) -> int:
+        """Add entities, or update their type, and add any observations they don't already have"""
+        with self.timed("create_entities"), self.transaction() as conn:
+            for entity in entities:
+                conn.execute('''
+                    INSERT INTO entities (name, entity_type) VALUES (?, ?)
+                    ON CONFLICT(name) DO UPDATE SET entity_type=excluded.entity_type, updated_at=datetime('now')
+                ''', (entity["name"], entity["entityType"]))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO observations (entity_name, content) VALUES (?, ?)",
+                    [(entity["name"], observation) for observation in entity.get("observations", [])],
+                )
+        return len(entities)
+
+    def create_relations(self, relations: list[dict]) -> int:
+        with self.timed("create_relations"), self.transaction() as conn:
+            names = {name for relation in relations for name in (relation["source"], relation["target"])}
+            placeholders = ",".join("?" * len(names))
+            known = {row[0] for row in conn.execute(f"SELECT name FROM entities WHERE name IN ({placeholders})", list(names))}
+            missing = sorted(names - known)
+            if missing:
+                raise ValueError(f"Unknown entities: {', '.join(missing)}; create them first")
+            conn.executemany(
+                "INSERT OR IGNORE INTO relations (source, target, relation_type) VALUES (?, ?, ?)",
+                [(relation["source"], relation["target"], relation["type"]) for relation in relations],
+            )
+        return len(relations)
+
+    def delete_entity(self, name: str) -> None:
+        with self.timed("delete_entity"), self.transaction() as conn:
+            if conn.execute("DELETE FROM entities WHERE name = ?", (name,)).rowcount == 0:
+                raise ValueError(f"Entity not found: {name}")
+
+    def delete_relation(self, source: str, target: str, type: str) -> None:
+        with self.timed("delete_relation"), self.transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM relations WHERE source = ? AND target = ? AND relation_type = ?", (source, target, type)
+            ).rowcount
+            if deleted == 0:
+                raise ValueError(f"Relation not found: {source} -{type}-> {target}")
+
+    def _graph(self, conn, names: list[str]) -> dict:
+        """The entities with these names, in this order, with their observations and the relations between any of them"""
+        if not names:
+            return {"entities": [], "relations": []}
+        placeholders = ",".join("?" * len(names))
+        types = dict(conn.execute(f"SELECT name, entity_type FROM entities WHERE name IN ({placeholders})", names))
+        observations = defaultdict(list)
+        rows = conn.execute(
+            f"SELECT entity_name, content FROM observations WHERE entity_name IN ({placeholders}) ORDER BY id", names
+        )
+        for name, content in rows:
+            observations[name].append(content)
+        relations = conn.execute(f'''
+            SELECT source, target, relation_type FROM relations
+            WHERE source IN ({placeholders}) OR target IN ({placeholders})
+            ORDER BY id
+        ''', names + names).fetchall()
+        return {
+            "entities": [
+                {"name": name, "entityType": types[name], "observations": observations[name]}
+                for name in names
+                if name in types
+            ],
+            "relations": [{"source": source, "target": target, "type": type} for source, target, type in relations],
+        }
+
+    def search_nodes(self, query: str, limit: int = SEARCH_LIMIT) -> dict:
+        """The entities whose name, type or observations best match the words of the query, most relevant first"""
+        with self.timed("search_nodes"):
+            conn = self.connection()
+            match = fts_query(query)
+            if not match:
+                return {"entities": [], "relations": []}
+            rows = conn.execute('''
+                SELECT name, MIN(score) FROM (
+                    SELECT entities.name AS name, bm25(entities_fts) AS score
+                    FROM entities_fts JOIN entities ON entities.rowid = entities_fts.rowid
+                    WHERE entities_fts MATCH ?
+                    UNION ALL
+                    SELECT observations.entity_name AS name, bm25(observations_fts) AS score
+                    FROM observations_fts JOIN observations ON observations.id = observations_fts.rowid
+                    WHERE observations_fts MATCH ?
+                )
+                GROUP BY name
+                ORDER BY MIN(score)
+                LIMIT ?
+            ''', (match, match, limit)).fetchall()
+            return self._graph(conn, [name for name, _ in rows])
+
+    def read_graph(self, limit: int = READ_GRAPH_LIMIT) -> dict:
+        """The most recently updated entities and their relations"""
+        with self.timed("read_graph"):
+            conn = self.connection()
+            rows = conn.execute("SELECT name FROM entities ORDER BY updated_at DESC, rowid DESC LIMIT ?", (limit,))
+            return self._graph(conn, [name for (name,) in rows])
+
+    def import_libsql(self, path: str) -> int:
+        """Merge in the entities, observations and relations of a database written by mcp-memory-libsql"""
+        source = sqlite3.connect(path)
+        entities = defaultdict(lambda: {"observations": []})
+        for name, entity_type in source.execute("SELECT name, entity_type FROM entities"):
+            entities[name].update(name=name, entityType=entity_type)
+        for name, content in source.execute("SELECT entity_name, content FROM observations ORDER BY rowid"):
+            if name in entities:
+                entities[name]["observations"].append(content)
+        relations = [
+            {"source": source_name, "target": target, "type": relation_type}
+            for source_name, target, relation_type in source.execute("SELECT source, target, relation_type FROM relations")
+            if source_name in entities and target in entities
+        ]
+        source.close()
+        self.create_entities([entity for entity in entities.values() if "name" in entity])
+        if relations:
+            self.create_relations(relations)
+        return len(entities)
+
+
+if __name__ == "__main__":
+    # Merge the per-trader memories written by mcp-memory-libsql into the shared graph: uv run knowledge_graph.py memory/*.db
+    import sys
+
+    graph = KnowledgeGraph()
+    for path in sys.argv[1:]:
+        if os.path.abspath(path) != os.path.abspath(graph.path):
+            print(f"Imported {graph.import_libsql(path)} entities from {path}")
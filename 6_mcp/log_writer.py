@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from database import write_logs
+
+MAX_QUEUE = 10_000
+BATCH_SIZE = 200
+FLUSH_INTERVAL_SECONDS = 0.5
+
+_STOP = object()
+
+
+class LogWriter:
+    """
+    Write log entries from a background thread, so callers on the event loop never wait on SQLite.
+    Entries are queued, then written in batches with a single executemany per transaction, whenever
+    a batch fills up or FLUSH_INTERVAL_SECONDS has passed. If the queue is full, entries are dropped and counted.
+    Log entries go to the logs table; pass another write function, like write_spans, to batch other rows the same way.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = MAX_QUEUE,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+        write: Callable[[list], None] = write_logs,
+    ):
+        self.write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, name: str, type: str, message: str) -> bool:
+        """Queue a log entry, timestamped now; return False if it had to be dropped."""
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        return self.put((name.lower(), timestamp, type, message))
+
+    def put(self, entry: tuple) -> bool:
+        """Queue a row for the write function as it is; return False if it had to be dropped."""
+        if self.closed:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self) -> None:
+        """Block until every entry queued so far has been written."""
+        if self.thread.is_alive():
+            self.queue.join()
+
+    def shutdown(self, timeout: float | None = 10) -> None:
+        """Write everything still queued, then stop the background thread."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
+
+    def _next_batch(self) -> tuple[list, bool]:
+        batch = []
+        stop = False
+        entry = self.queue.get()
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if entry is _STOP:
+                stop = True
+                self.queue.task_done()
+                break
+            batch.append(entry)
+            if len(batch) >= self.batch_size:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return batch, stop
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch:
+                try:
+                    self.write(batch)
+                    self.written += len(batch)
+                    self.batches += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Failed to write {len(batch)} entries: {e}")
+                for _ in batch:
+                    self.queue.task_done()
@@ -1,9 +1,13 @@
 from polygon import RESTClient
 from dotenv import load_dotenv
 import os
+import time
+import threading
+from concurrent.futures import Future
+from typing import Callable
 from datetime import datetime
-import random
-from database import write_market, read_market
+from database import write_market, read_market_prices
+from simulator import simulator
 from functools import lru_cache
 from datetime import timezone
 
@@ -15,41 +19,64 @@ polygon_plan = os.getenv("POLYGON_PLAN")
 is_paid_polygon = polygon_plan == "paid"
 is_realtime_polygon = polygon_plan == "realtime"
 
+# How long a looked-up price is reused before asking the market again
+PRICE_CACHE_TTL_SECONDS = float(os.getenv("PRICE_CACHE_TTL_SECONDS", "60"))
+
+_price_cache: dict[str, tuple[float, float]] = {}
+_in_flight: dict[str, Future] = {}
+_price_lock = threading.Lock()
+
+# When set, e.g. by a backtest, prices come from this function instead of the market
+_price_source: Callable[[list[str]], dict[str, float]] | None = None
+
+
+@lru_cache(maxsize=1)
+def get_client() -> RESTClient:
+    """One Polygon client, and its connection pool, shared by every lookup in this process"""
+    return RESTClient(polygon_api_key)
+
 
 def is_market_open() -> bool:
-    client = RESTClient(polygon_api_key)
+    client = get_client()
     market_status = client.get_market_status()
     return market_status.market == "open"
 
 
-def get_all_share_prices_polygon_eod() -> dict[str, float]:
+def get_all_share_prices_polygon_eod() -> tuple[str, dict[str, float]]:
     """With much thanks to student Reema R. for fixing the timezone issue with this!"""
-    client = RESTClient(polygon_api_key)
+    client = get_client()
 
     probe = client.get_previous_close_agg("SPY")[0]
     last_close = datetime.fromtimestamp(probe.timestamp / 1000, tz=timezone.utc).date()
 
     results = client.get_grouped_daily_aggs(last_close, adjusted=True, include_otc=False)
-    return {result.ticker: result.close for result in results}
+    return last_close.strftime("%Y-%m-%d"), {result.ticker: result.close for result in results}
+
 
+_market_lock = threading.Lock()
 
-@lru_cache(maxsize=2)
-def get_market_for_prior_date(today):
-    market_data = read_market(today)
-    if not market_data:
-        market_data = get_all_share_prices_polygon_eod()
-        write_market(today, market_data)
-    return market_data
+
+def get_market_prices_for_prior_date(today: str, symbols: list[str]) -> dict[str, float]:
+    """Read prior-close prices from the local store, downloading the whole market once per day if it's missing"""
+    prices = read_market_prices(today, symbols)
+    if prices is None:
+        with _market_lock:
+            prices = read_market_prices(today, symbols)
+            if prices is None:
+                trading_date, market_data = get_all_share_prices_polygon_eod()
+                # Stored under the session they closed, so days that fall back to the same session share one copy
+                write_market(today, market_data, trading_date)
+                prices = {symbol: market_data[symbol] for symbol in symbols if symbol in market_data}
+    return prices
 
 
 def get_share_price_polygon_eod(symbol) -> float:
     today = datetime.now().date().strftime("%Y-%m-%d")
-    market_data = get_market_for_prior_date(today)
-    return market_data.get(symbol, 0.0)
+    return get_market_prices_for_prior_date(today, [symbol]).get(symbol, 0.0)
 
 
 def get_share_price_polygon_min(symbol) -> float:
-    client = RESTClient(polygon_api_key)
+    client = get_client()
     result = client.get_snapshot_ticker("stocks", symbol)
     return result.min.close or result.prev_day.close
 
@@ -61,10 +88,80 @@ def get_share_price_polygon(symbol) -> float:
         return get_share_price_polygon_eod(symbol)
 
 
-def get_share_price(symbol) -> float:
+def get_share_prices_polygon(symbols: list[str]) -> dict[str, float]:
+    if is_paid_polygon:
+        client = get_client()
+        snapshots = client.get_snapshot_all("stocks", tickers=symbols)
+        prices = {snapshot.ticker: snapshot.min.close or snapshot.prev_day.close for snapshot in snapshots}
+    else:
+        today = datetime.now().date().strftime("%Y-%m-%d")
+        prices = get_market_prices_for_prior_date(today, symbols)
+    return {symbol: prices.get(symbol, 0.0) for symbol in symbols}
+
+
+def fetch_share_prices(symbols: list[str]) -> dict[str, float]:
+    """Ask the market for the prices of several symbols in one round trip, bypassing the cache"""
+    if _price_source:
+        return _price_source(symbols)
     if polygon_api_key:
         try:
-            return get_share_price_polygon(symbol)
+            return get_share_prices_polygon(symbols)
         except Exception as e:
-            print(f"Was not able to use the polygon API due to {e}; using a random number")
-    return float(random.randint(1, 100))
+            print(f"Was not able to use the polygon API due to {e}; using the market simulator")
+    return simulator.get_share_prices(symbols)
+
+
+def clear_price_cache() -> None:
+    with _price_lock:
+        _price_cache.clear()
+
+
+def set_price_source(source: Callable[[list[str]], dict[str, float]] | None) -> None:
+    """Take prices from source instead of the market, or from the market again if source is None"""
+    global _price_source
+    _price_source = source
+    clear_price_cache()
+
+
+def get_share_prices(symbols: list[str], max_age: float | None = None) -> dict[str, float]:
+    """
+    Look up the prices of several symbols, reusing prices fetched within max_age seconds
+    (PRICE_CACHE_TTL_SECONDS by default) and fetching the rest in a single batch.
+    If another thread is already fetching a symbol, wait for its answer instead of asking again.
+    """
+    max_age = PRICE_CACHE_TTL_SECONDS if max_age is None else max_age
+    now = time.monotonic()
+    prices, waiting, mine = {}, {}, {}
+    with _price_lock:
+        for symbol in dict.fromkeys(symbols):
+            cached = _price_cache.get(symbol)
+            if cached and now - cached[1] <= max_age:
+                prices[symbol] = cached[0]
+            elif symbol in _in_flight:
+                waiting[symbol] = _in_flight[symbol]
+            else:
+                mine[symbol] = _in_flight[symbol] = Future()
+    if mine:
+        try:
+            fetched = fetch_share_prices(list(mine))
+        except BaseException as e:
+            with _price_lock:
+                for symbol, future in mine.items():
+                    del _in_flight[symbol]
+                    future.set_exception(e)
+            raise
+        with _price_lock:
+            fetched_at = time.monotonic()
+            for symbol, future in mine.items():
+                price = fetched.get(symbol, 0.0)
+                _price_cache[symbol] = (price, fetched_at)
+                del _in_flight[symbol]
+                future.set_result(price)
+                prices[symbol] = price
+    for symbol, future in waiting.items():
+        prices[symbol] = future.result()
+    return {symbol: prices[symbol] for symbol in symbols}
+
+
+def get_share_price(symbol) -> float:
+    return get_share_prices([symbol])[symbol]
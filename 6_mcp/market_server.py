@@ -1,5 +1,6 @@
+import asyncio
 from mcp.server.fastmcp import FastMCP
-from market import get_share_price
+from market import get_share_price, get_share_prices
 
 mcp = FastMCP("market_server")
 
@@ -10,7 +11,17 @@ async def lookup_share_price(symbol: str) -> float:
     Args:
         symbol: the symbol of the stock
     """
-    return get_share_price(symbol)
+    return await asyncio.to_thread(get_share_price, symbol)
+
+
+@mcp.tool()
+async def lookup_share_prices(symbols: list[str]) -> dict[str, float]:
+    """This tool provides the current prices of several stock symbols in one lookup.
+
+    Args:
+        symbols: the symbols of the stocks
+    """
+    return await asyncio.to_thread(get_share_prices, symbols)
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from agents.mcp import MCPServer
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+SEARCH_TTL_SECONDS = float(os.getenv("SEARCH_TTL_SECONDS", "900"))
+FETCH_TTL_SECONDS = float(os.getenv("FETCH_TTL_SECONDS", "3600"))
+# After its TTL, a result is still served for this much longer while it's refreshed in the background
+STALE_SECONDS = float(os.getenv("RESEARCH_STALE_SECONDS", "1800"))
+MAX_ENTRIES = 2_000
+
+# Which tools of which servers are cached, and for how long, keyed by the package that provides the server
+CACHE_POLICIES = {
+    "@modelcontextprotocol/server-brave-search": {
+        "brave_web_search": SEARCH_TTL_SECONDS,
+        "brave_local_search": SEARCH_TTL_SECONDS,
+    },
+    "mcp-server-fetch": {"fetch": FETCH_TTL_SECONDS},
+}
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+
+def cache_key(tool_name: str, arguments: dict | None) -> str:
+    """The address of a request: a hash of the tool and its arguments, with queries and URLs normalized"""
+    normalized = {}
+    for key, value in (arguments or {}).items():
+        if key == "query" and isinstance(value, str):
+            value = " ".join(value.lower().split())
+        elif key == "url" and isinstance(value, str):
+            value = normalize_url(value)
+        normalized[key] = value
+    request = json.dumps([tool_name, normalized], sort_keys=True)
+    return hashlib.sha256(request.encode()).hexdigest()
+
+
+class ToolCache:
+    """
+    Results of one kind of server's tool calls, shared by every trader in the process.
+    Fresh results are served from memory; stale ones are served while one background call refreshes them;
+    and concurrent identical requests wait for a single call rather than each making their own.
+    """
+
+    def __init__(self, ttls: dict[str, float], stale_seconds: float = STALE_SECONDS, max_entries: int = MAX_ENTRIES):
+        self.ttls = ttls
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self.in_flight: dict[str, asyncio.Future] = {}
+        self._refreshing: set[asyncio.Task] = set()
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "errors": 0}
+
+    async def call(self, server: MCPServer, tool_name: str, arguments: dict | None):
+        ttl = self.ttls.get(tool_name)
+        if ttl is None:
+            return await server.call_tool(tool_name, arguments)
+        key = cache_key(tool_name, arguments)
+        entry = self.entries.get(key)
+        if entry:
+            age = time.monotonic() - entry[0]
+            if age <= ttl:
+                self.counters["hits"] += 1
+                self.entries.move_to_end(key)
+                return entry[1]
+            if age <= ttl + self.stale_seconds:
+                self.counters["stale_hits"] += 1
+                if key not in self.in_flight:
+                    self.counters["refreshes"] += 1
+                    task = asyncio.create_task(self._refresh(server, key, tool_name, arguments))
+                    self._refreshing.add(task)
+                    task.add_done_callback(self._refreshing.discard)
+                return entry[1]
+        while key in self.in_flight:
+            self.counters["coalesced"] += 1
+            future = self.in_flight[key]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Only pass on our own cancellation; if the caller making the request was cancelled, make it ourselves
+                if asyncio.current_task().cancelling() or not future.cancelled():
+                    raise
+        self.counters["misses"] += 1
+        return await self._fetch(server, key, tool_name, arguments)
+
+    async def _fetch(self, server: MCPServer, key: str, tool_name: str, arguments: dict | None):
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await server.call_tool(tool_name, arguments)
+        except asyncio.CancelledError:
+            # The caller was cancelled, not the request: release anyone waiting on it to make their own
+            future.cancel()
+            raise
+        except BaseException as e:
+            self.counters["errors"] += 1
+            future.set_exception(e)
+            # Nobody else may be waiting; don't let the event loop complain that the exception went unretrieved
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+        if getattr(result, "isError", False):
+            # Rate limits and failures are passed on but never cached
+            self.counters["errors"] += 1
+        else:
+            self.entries[key] = (time.monotonic(), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    async def _refresh(self, server: MCPServer, key: str, tool_name: str, arguments: dict | None):
+        try:
+            await self._fetch(server, key, tool_name, arguments)
+        except Exception as e:
+            print(f"Could not refresh cached {tool_name} result: {e!r}")
+
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self.entries)}
+
+
+_caches: dict[str, ToolCache] = {}
+
+
+def cache_for(params: dict) -> ToolCache | None:
+    """The process-wide cache for the server these params launch, if its tools are cached"""
+    for package, ttls in CACHE_POLICIES.items():
+        if package in params.get("args", []):
+            if package not in _caches:
+                _caches[package] = ToolCache(ttls)
+            return _caches[package]
+    return None
+
+
+class CachingMCPServer(MCPServer):
+    """An MCP server whose cacheable tool calls go through a shared ToolCache"""
+
+    def __init__(self, server: MCPServer, cache: ToolCache):
+        self.server = server
+        self.cache = cache
+
+    def __getattr__(self, attribute):
+        # Anything else, such as the session used for health checks, is the wrapped server's
+        if attribute == "server":
+            raise AttributeError(attribute)
+        return getattr(self.server, attribute)
+
+    @property
+    def name(self) -> str:
+        return self.server.name
+
+    async def connect(self):
+        await self.server.connect()
+
+    async def cleanup(self):
+        await self.server.cleanup()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.cleanup()
+
+    async def list_tools(self):
+        return await self.server.list_tools()
+
+    async def call_tool(self, tool_name, arguments):
+        return await self.cache.call(self.server, tool_name, arguments)
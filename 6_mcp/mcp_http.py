@@ -0,0 +1,21 @@
+import uvicorn
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from accounts_server import mcp as accounts_mcp
+from market_server import mcp as market_mcp
+from memory_server import mcp as memory_mcp
+from mcp_params import MCP_HTTP_HOST, MCP_HTTP_PORT
+
+# One local endpoint serving our servers over SSE, at /accounts/sse, /market/sse and /memory/sse
+
+app = Starlette(
+    routes=[
+        Mount("/accounts", app=accounts_mcp.sse_app()),
+        Mount("/market", app=market_mcp.sse_app()),
+        Mount("/memory", app=memory_mcp.sse_app()),
+    ]
+)
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=MCP_HTTP_HOST, port=MCP_HTTP_PORT)
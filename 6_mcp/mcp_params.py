@@ -7,6 +7,25 @@ load_dotenv(override=True)
 brave_env = {"BRAVE_API_KEY": os.getenv("BRAVE_API_KEY")}
 polygon_api_key = os.getenv("POLYGON_API_KEY")
 
+# How to reach our own Python servers (accounts, market and memory):
+# "stdio" launches each as a child process, "inprocess" mounts them in this process,
+# and "sse" connects to the single shared endpoint started with: uv run mcp_http.py
+
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio").strip().lower()
+MCP_HTTP_HOST = os.getenv("MCP_HTTP_HOST", "127.0.0.1")
+MCP_HTTP_PORT = int(os.getenv("MCP_HTTP_PORT", "8765"))
+MCP_HTTP_URL = f"http://{MCP_HTTP_HOST}:{MCP_HTTP_PORT}"
+
+
+def local_mcp(server: str, transport: str = MCP_TRANSPORT) -> dict:
+    """The params for one of our own servers, like accounts_server, over the chosen transport"""
+    if transport == "inprocess":
+        return {"inprocess": server}
+    if transport == "sse":
+        return {"url": f"{MCP_HTTP_URL}/{server.removesuffix('_server')}/sse"}
+    return {"command": "uv", "args": ["run", f"{server}.py"]}
+
+
 # The MCP server for the Trader to read Market Data
 
 if is_paid_polygon or is_realtime_polygon:
@@ -16,13 +35,13 @@ if is_paid_polygon or is_realtime_polygon:
         "env": {"POLYGON_API_KEY": polygon_api_key},
     }
 else:
-    market_mcp = {"command": "uv", "args": ["run", "market_server.py"]}
+    market_mcp = local_mcp("market_server")
 
 
 # The full set of MCP servers for the trader: Accounts, Push Notification and the Market
 
 trader_mcp_server_params = [
-    {"command": "uv", "args": ["run", "accounts_server.py"]},
+    local_mcp("accounts_server"),
     {"command": "uv", "args": ["run", "push_server.py"]},
     market_mcp,
 ]
@@ -38,9 +57,7 @@ def researcher_mcp_server_params(name: str):
             "args": ["-y", "@modelcontextprotocol/server-brave-search"],
             "env": brave_env,
         },
-        {
-            "command": "npx",
-            "args": ["-y", "mcp-memory-libsql"],
-            "env": {"LIBSQL_URL": f"file:./memory/{name}.db"},
-        },
+        # One knowledge graph in memory/memory.db, shared by every trader; uv run knowledge_graph.py memory/*.db
+        # merges in the per-trader databases that mcp-memory-libsql used to write
+        local_mcp("memory_server"),
     ]
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import time
+from collections import deque
+from agents.mcp import MCPServer
+from mcp_transports import create_mcp_server
+from mcp_cache import CachingMCPServer
+
+HEALTH_CHECK_TIMEOUT_SECONDS = 30
+LATENCY_SAMPLES = 1_000
+
+
+def server_name(params: dict) -> str:
+    """A readable name for a server, like accounts_server.py or mcp-server-fetch"""
+    if "inprocess" in params:
+        return params["inprocess"]
+    if "url" in params:
+        return params["url"]
+    args = [arg for arg in params.get("args", []) if not arg.startswith("-")]
+    name = args[-1] if args else params["command"]
+    if "LIBSQL_URL" in (params.get("env") or {}):
+        name += f" ({params['env']['LIBSQL_URL']})"
+    return name
+
+
+class PooledMCPServer(MCPServer):
+    """A long-lived MCP server, over any transport, that records how long it took to start and how long its tool calls take"""
+
+    def __init__(self, params: dict):
+        self.server = create_mcp_server(params)
+        self._name = server_name(params)
+        self.tools = None
+        self.startup_seconds = None
+        self.calls = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def connect(self):
+        start = time.perf_counter()
+        await self.server.connect()
+        self.startup_seconds = time.perf_counter() - start
+
+    async def cleanup(self):
+        await self.server.cleanup()
+
+    async def ping(self):
+        """Check that the server is still answering; in-process servers always are"""
+        if hasattr(self.server, "session"):
+            if not self.server.session:
+                raise ConnectionError("not connected")
+            await asyncio.wait_for(self.server.session.send_ping(), HEALTH_CHECK_TIMEOUT_SECONDS)
+
+    async def list_tools(self):
+        if self.tools is None:
+            self.tools = await self.server.list_tools()
+        return self.tools
+
+    async def call_tool(self, tool_name, arguments):
+        start = time.perf_counter()
+        try:
+            return await self.server.call_tool(tool_name, arguments)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.calls += 1
+            self.latencies.append(time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        stats = {
+            "server": self.name,
+            "startup_seconds": self.startup_seconds,
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_seconds": latencies[len(latencies) // 2] if latencies else None,
+            "p95_seconds": latencies[int(len(latencies) * 0.95)] if latencies else None,
+        }
+        if isinstance(self.server, CachingMCPServer):
+            stats["cache"] = self.server.cache.stats()
+        return stats
+
+
+class MCPServerPool:
+    """
+    Starts each distinct MCP server once and shares it between every trader that asks for the same params,
+    so servers with identical params (accounts, push, market, fetch, search) run as one process for all traders.
+    Start, health-check and close the pool from the same task: stdio clients must be torn down by the task that opened them.
+    """
+
+    def __init__(self):
+        self.servers: dict[str, PooledMCPServer] = {}
+        self.params: dict[str, dict] = {}
+        self.restarts: dict[str, int] = {}
+
+    @staticmethod
+    def key(params: dict) -> str:
+        return json.dumps(params, sort_keys=True)
+
+    async def start(self, params_list: list[dict]) -> None:
+        """
+        Start any of these servers that aren't already running. A server that fails to start is reported and
+        left down, for the next health check to retry, so one missing tool or bad key can't stop the others.
+        """
+        for params in params_list:
+            key = self.key(params)
+            self.params.setdefault(key, params)
+            self.restarts.setdefault(key, 0)
+            if key not in self.servers:
+                server = PooledMCPServer(params)
+                try:
+                    await server.connect()
+                except Exception as e:
+                    print(f"Could not start MCP server {server.name} ({e!r}); will retry at the next health check")
+                    try:
+                        await server.cleanup()
+                    except Exception:
+                        pass
+                    continue
+                self.servers[key] = server
+
+    def get(self, params_list: list[dict]) -> list[PooledMCPServer]:
+        """The running servers for these params; raises ConnectionError, failing just that trader's run, if any is down"""
+        down = [server_name(params) for params in params_list if self.key(params) not in self.servers]
+        if down:
+            raise ConnectionError(f"MCP servers not running: {', '.join(down)}")
+        return [self.servers[self.key(params)] for params in params_list]
+
+    async def check_health(self) -> None:
+        """Ping every server, restarting any that has crashed or stopped answering"""
+        for key, server in list(self.servers.items()):
+            try:
+                await server.ping()
+            except Exception as e:
+                print(f"MCP server {server.name} is unhealthy ({e!r}); restarting it")
+                await server.cleanup()
+                del self.servers[key]
+                self.restarts[key] += 1
+        await self.start(list(self.params.values()))
+
+    def report(self) -> list[dict]:
+        running = [{**server.stats(), "restarts": self.restarts[key]} for key, server in self.servers.items()]
+        down = [
+            {"server": server_name(params), "down": True, "restarts": self.restarts[key]}
+            for key, params in self.params.items()
+            if key not in self.servers
+        ]
+        return running + down
+
+    async def close(self) -> None:
+        for server in reversed(list(self.servers.values())):
+            await server.cleanup()
+        self.servers.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
@@ -0,0 +1,61 @@
+import importlib
+from agents.mcp import MCPServer, MCPServerSse, MCPServerStdio
+from mcp.types import CallToolResult, TextContent
+from mcp_cache import CachingMCPServer, cache_for
+
+
+class InProcessMCPServer(MCPServer):
+    """
+    Serve a FastMCP server from this process: tools are listed and called by direct dispatch to the FastMCP
+    instance, with the same schemas the server would publish over stdio, but without a child process.
+    """
+
+    def __init__(self, module: str):
+        self.module = module
+        self.mcp = None
+
+    @property
+    def name(self) -> str:
+        return f"in-process: {self.module}"
+
+    async def connect(self):
+        self.mcp = importlib.import_module(self.module).mcp
+
+    async def cleanup(self):
+        pass
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.cleanup()
+
+    async def list_tools(self):
+        return await self.mcp.list_tools()
+
+    async def call_tool(self, tool_name, arguments) -> CallToolResult:
+        try:
+            content = await self.mcp.call_tool(tool_name, arguments or {})
+            return CallToolResult(content=list(content), isError=False)
+        except Exception as e:
+            # Report failures to the agent the same way a FastMCP server does over stdio
+            return CallToolResult(content=[TextContent(type="text", text=str(e))], isError=True)
+
+
+def create_mcp_server(params: dict, client_session_timeout_seconds: float = 120) -> MCPServer:
+    """
+    Make the MCP server described by params:
+    {"inprocess": module} mounts that module's FastMCP server in this process,
+    {"url": ...} connects to a server over HTTP with SSE, anything else is launched over stdio.
+    Research servers (search and fetch) share a cache of their results across every server made for them.
+    """
+    if "inprocess" in params:
+        return InProcessMCPServer(params["inprocess"])
+    if "url" in params:
+        return MCPServerSse(
+            params, cache_tools_list=True, client_session_timeout_seconds=client_session_timeout_seconds
+        )
+    server = MCPServerStdio(params, client_session_timeout_seconds=client_session_timeout_seconds)
+    cache = cache_for(params)
+    return CachingMCPServer(server, cache) if cache else server
@@ -0,0 +1,84 @@
+import asyncio
+import json
+from pydantic import BaseModel, Field
+from mcp.server.fastmcp import FastMCP
+from knowledge_graph import KnowledgeGraph
+
+mcp = FastMCP("memory_server")
+graph = KnowledgeGraph()
+
+
+class Entity(BaseModel):
+    name: str
+    entityType: str
+    observations: list[str] = Field(default_factory=list)
+
+
+class Relation(BaseModel):
+    source: str
+    target: str
+    type: str
+
+
+@mcp.tool()
+async def create_entities(entities: list[Entity]) -> str:
+    """Create new entities with observations, or add observations to existing ones.
+
+    Args:
+        entities: The entities, each with a name, an entityType and a list of observations
+    """
+    count = await asyncio.to_thread(graph.create_entities, [entity.model_dump() for entity in entities])
+    return f"Successfully processed {count} entities"
+
+@mcp.tool()
+async def search_nodes(query: str) -> str:
+    """Search for entities, and the relations between them, by words in their names, types or observations.
+
+    Args:
+        query: The words to search for
+    """
+    return json.dumps(await asyncio.to_thread(graph.search_nodes, query))
+
+@mcp.tool()
+async def read_graph() -> str:
+    """Get the most recently updated entities and their relations."""
+    return json.dumps(await asyncio.to_thread(graph.read_graph))
+
+@mcp.tool()
+async def create_relations(relations: list[Relation]) -> str:
+    """Create relations between entities that already exist.
+
+    Args:
+        relations: The relations, each with a source entity, a target entity and a type
+    """
+    count = await asyncio.to_thread(graph.create_relations, [relation.model_dump() for relation in relations])
+    return f"Created {count} relations"
+
+@mcp.tool()
+async def delete_entity(name: str) -> str:
+    """Delete an entity, with its observations and relations.
+
+    Args:
+        name: The name of the entity to delete
+    """
+    await asyncio.to_thread(graph.delete_entity, name)
+    return f"Successfully deleted entity {name}"
+
+@mcp.tool()
+async def delete_relation(source: str, target: str, type: str) -> str:
+    """Delete a relation between two entities.
+
+    Args:
+        source: The source entity of the relation
+        target: The target entity of the relation
+        type: The type of the relation
+    """
+    await asyncio.to_thread(graph.delete_relation, source, target, type)
+    return f"Successfully deleted relation {source} -{type}-> {target}"
+
+@mcp.resource("memory://stats")
+async def read_stats_resource() -> str:
+    return json.dumps(graph.stats())
+
+if __name__ == "__main__":
+    mcp.run(transport='stdio')
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+import random
+import time
+from agents import OpenAIChatCompletionsModel
+from dotenv import load_dotenv
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
+
+load_dotenv(override=True)
+
+# Requests and tokens per minute for each provider; override with e.g. DEEPSEEK_RPM=120 or GEMINI_TPM=500000
+DEFAULT_LIMITS = {
+    "openrouter": (60, 200_000),
+    "deepseek": (60, 200_000),
+    "grok": (60, 200_000),
+    "gemini": (15, 250_000),
+}
+
+MAX_ATTEMPTS = 6
+BASE_BACKOFF_SECONDS = 2
+MAX_BACKOFF_SECONDS = 120
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """
+    A bucket that refills continuously up to its capacity. Callers wait their turn in order,
+    so a burst is spread out at the refill rate instead of being rejected.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> float:
+        """Take amount from the bucket, waiting until it's there; returns how long we waited"""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.level < amount:
+                delay = (amount - self.level) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.level -= amount
+        return waited
+
+    def charge(self, amount: float):
+        """Take amount without waiting, e.g. once a response tells us what a call really cost; may go negative"""
+        self._refill()
+        self.level -= amount
+
+
+class ProviderLimiter:
+    """Request and token buckets for one provider, plus a shared pause when the provider tells us to back off"""
+
+    def __init__(self, provider: str, requests_per_minute: float, tokens_per_minute: float):
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self.counters = {
+            "requests": 0,
+            "tokens": 0,
+            "rate_limited": 0,
+            "retries": 0,
+            "failures": 0,
+            "throttled_seconds": 0.0,
+        }
+
+    async def acquire(self, estimated_tokens: int):
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+            self.counters["throttled_seconds"] += pause
+        waited = await self.requests.acquire(1)
+        waited += await self.tokens.acquire(estimated_tokens)
+        self.counters["throttled_seconds"] += waited
+
+    def record(self, estimated_tokens: int, actual_tokens: int | None):
+        self.counters["requests"] += 1
+        if actual_tokens is not None:
+            self.counters["tokens"] += actual_tokens
+            self.tokens.charge(actual_tokens - estimated_tokens)
+
+    def back_off(self, seconds: float):
+        """Hold every caller of this provider for the given time, not just the one that was told to wait"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        return {"provider": self.provider, **self.counters}
+
+
+def make_limiter(provider: str) -> ProviderLimiter:
+    rpm, tpm = DEFAULT_LIMITS[provider]
+    rpm = float(os.getenv(f"{provider.upper()}_RPM", rpm))
+    tpm = float(os.getenv(f"{provider.upper()}_TPM", tpm))
+    return ProviderLimiter(provider, rpm, tpm)
+
+
+limiters = {provider: make_limiter(provider) for provider in DEFAULT_LIMITS}
+
+
+def provider_stats() -> list[dict]:
+    return [limiter.stats() for limiter in limiters.values()]
+
+
+def retry_after(error: APIStatusError) -> float | None:
+    """The wait the provider asked for in its Retry-After headers, if any"""
+    for header, divisor in (("retry-after-ms", 1000), ("retry-after", 1)):
+        try:
+            return float(error.response.headers[header]) / divisor
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+def estimate_tokens(system_instructions, input, tools) -> int:
+    text = (system_instructions or "") + json.dumps(input, default=str)
+    text += "".join(getattr(tool, "description", "") or "" for tool in tools)
+    return len(text) // CHARS_PER_TOKEN
+
+
+def throttled_client(base_url: str, api_key: str | None) -> AsyncOpenAI:
+    """A client that leaves retries to ThrottledChatCompletionsModel, so the backoff is shared by every caller"""
+    return AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+
+
+class ThrottledChatCompletionsModel(OpenAIChatCompletionsModel):
+    """
+    A chat completions model that waits for its provider's rate limits before each call,
+    and retries rate limits and server errors with backoff, honoring Retry-After.
+    """
+
+    def __init__(self, model: str, openai_client: AsyncOpenAI, limiter: ProviderLimiter):
+        super().__init__(model=model, openai_client=openai_client)
+        self.limiter = limiter
+
+    async def get_response(self, system_instructions, input, model_settings, tools, *args, **kwargs):
+        estimated = estimate_tokens(system_instructions, input, tools)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            await self.limiter.acquire(estimated)
+            try:
+                response = await super().get_response(
+                    system_instructions, input, model_settings, tools, *args, **kwargs
+                )
+            except (APIStatusError, APIConnectionError) as e:
+                status = getattr(e, "status_code", None)
+                if status is not None and status not in RETRY_STATUSES:
+                    raise
+                if status == 429:
+                    self.limiter.counters["rate_limited"] += 1
+                if attempt == MAX_ATTEMPTS:
+                    self.limiter.counters["failures"] += 1
+                    raise
+                backoff = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                delay = (retry_after(e) if status is not None else None) or random.uniform(backoff / 2, backoff)
+                self.limiter.counters["retries"] += 1
+                print(f"{self.limiter.provider} returned {status or 'a connection error'}; retrying in {delay:.1f}s")
+                if status == 429:
+                    self.limiter.back_off(delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+            usage = response.usage.total_tokens if response.usage else None
+            self.limiter.record(estimated, usage)
+            return response
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, *args, **kwargs):
+        estimated = estimate_tokens(system_instructions, input, tools)
+        await self.limiter.acquire(estimated)
+        self.limiter.record(estimated, None)
+        async for event in super().stream_response(
+            system_instructions, input, model_settings, tools, *args, **kwargs
+        ):
+            yield event
@@ -0,0 +1,148 @@
+"""
+One view of every trader, computed on the server and shared by all dashboard sessions.
+A single task follows the event bus and re-renders a trader's panels when its account changes, re-prices
+every trader once per interval, and keeps the recent log lines. Sessions only receive what it produced,
+so the database and market load stays the same however many people are watching.
+The task runs only while someone is watching, and is restarted if it fails.
+"""
+
+import asyncio
+from collections import defaultdict
+from events import bus
+
+PRICE_REFRESH_SECONDS = 120
+RESTART_DELAY_SECONDS = 5
+WATCH_START_TIMEOUT_SECONDS = 10
+
+
+class ReadModel:
+    def __init__(self, traders: list, refresh_seconds: float = PRICE_REFRESH_SECONDS):
+        self.traders = {trader.name.lower(): trader for trader in traders}
+        self.refresh_seconds = refresh_seconds
+        self.panels: dict[str, tuple] = {}
+        self.logs: dict[str, tuple[str, list[str]]] = {}
+        self.log_ids: dict[str, int] = {}
+        self.subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self.renders = 0
+        self.errors = 0
+        self._rendering: dict[str, asyncio.Task] = {}
+        self._dirty: set[str] = set()
+        self._task = None
+        self._events: asyncio.Queue | None = None
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._lock:
+            if self._task is None:
+                # Subscribe before reading the logs, so nothing written in between is missed
+                self._events = bus.subscribe()
+                await asyncio.to_thread(bus.wait_until_watching, WATCH_START_TIMEOUT_SECONDS)
+                for name, trader in self.traders.items():
+                    try:
+                        html, lines, self.log_ids[name] = await asyncio.to_thread(trader.read_logs)
+                        self.logs[name] = html, lines
+                    except Exception as e:
+                        self._failed(f"read the logs of {name}", e)
+                        self.logs.setdefault(name, ("", []))
+                        self.log_ids.setdefault(name, 0)
+                    await self._render(name)
+                self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """Stop following changes; the next viewer starts again from a fresh render"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._events:
+            bus.unsubscribe(self._events)
+            self._events = None
+
+    async def updates(self, name: str):
+        """Yield ("panels", outputs) and ("logs", html) for one trader: the latest of each, then every change"""
+        await self.start()
+        name = name.lower()
+        queue = asyncio.Queue()
+        self.subscribers[name].add(queue)
+        try:
+            if name in self.panels:
+                yield "panels", self.panels[name]
+            yield "logs", self.logs[name][0]
+            while True:
+                yield await queue.get()
+        finally:
+            self.subscribers[name].discard(queue)
+            if not any(self.subscribers.values()):
+                self.stop()
+
+    def _publish(self, name: str, update: tuple):
+        for queue in self.subscribers[name]:
+            queue.put_nowait(update)
+
+    def _failed(self, action: str, e: Exception):
+        self.errors += 1
+        print(f"Dashboard read model could not {action}: {e!r}")
+
+    async def _run(self):
+        while True:
+            try:
+                async with asyncio.TaskGroup() as group:
+                    group.create_task(self._follow_changes())
+                    group.create_task(self._refresh_prices())
+            except Exception as e:
+                self._failed("follow changes; restarting", e)
+                await asyncio.sleep(RESTART_DELAY_SECONDS)
+
+    async def _follow_changes(self):
+        while True:
+            event = await self._events.get()
+            if event.name not in self.traders:
+                continue
+            if event.kind == "log":
+                # The first events can repeat rows the initial read already showed
+                entries = [entry for entry in event.data if entry[0] > self.log_ids[event.name]]
+                if not entries:
+                    continue
+                try:
+                    html, lines = self.traders[event.name].get_logs(self.logs[event.name][1], entries)
+                except Exception as e:
+                    self._failed(f"render the logs of {event.name}", e)
+                    continue
+                self.logs[event.name] = html, lines
+                self.log_ids[event.name] = entries[-1][0]
+                self._publish(event.name, ("logs", html))
+            else:
+                self._schedule(event.name)
+
+    async def _refresh_prices(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            for name in self.traders:
+                self._schedule(name)
+
+    def _schedule(self, name: str):
+        """Render a trader's panels, or if that's under way, render once more when it finishes"""
+        if name in self._rendering:
+            self._dirty.add(name)
+        else:
+            self._rendering[name] = asyncio.create_task(self._render_until_clean(name))
+
+    async def _render_until_clean(self, name: str):
+        try:
+            while True:
+                if await self._render(name):
+                    self._publish(name, ("panels", self.panels[name]))
+                if name not in self._dirty:
+                    break
+                self._dirty.discard(name)
+        finally:
+            del self._rendering[name]
+
+    async def _render(self, name: str) -> bool:
+        """Render a trader's panels; if that fails, say so and keep showing the last ones"""
+        try:
+            self.panels[name] = await asyncio.to_thread(self.traders[name].render)
+        except Exception as e:
+            self._failed(f"render {name}", e)
+            return False
+        self.renders += 1
+        return True
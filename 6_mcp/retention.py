@@ -0,0 +1,156 @@
+import gzip
+import json
+import os
+from datetime import date, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+from database import transaction, get_connection
+
+load_dotenv(override=True)
+
+# Days to keep each type of log entry in the logs table; None keeps them forever
+LOG_RETENTION_DAYS = {
+    "generation": 7,
+    "response": 7,
+    "mcp_tools": 7,
+    "function": 30,
+    "agent": 30,
+    "trace": 30,
+    "account": None,
+}
+DEFAULT_RETENTION_DAYS = 30
+# Days to keep the timing spans; they are only summarized, so they are deleted without archiving
+SPAN_RETENTION_DAYS = int(os.getenv("SPAN_RETENTION_DAYS", "30"))
+
+ARCHIVE_DIR = Path(os.getenv("LOG_ARCHIVE_DIR", "archive/logs"))
+BATCH_SIZE = 5_000
+
+
+def retention_policy() -> dict[str, int | None]:
+    """
+    The retention policy, with overrides from the LOG_RETENTION environment variable,
+    for example LOG_RETENTION="generation=3,function=14,account=forever"
+    """
+    policy = dict(LOG_RETENTION_DAYS)
+    for item in os.getenv("LOG_RETENTION", "").split(","):
+        if "=" in item:
+            type, days = (part.strip() for part in item.split("=", 1))
+            policy[type] = None if days.lower() == "forever" else int(days)
+    return policy
+
+
+def _archive(rows: list[tuple]) -> None:
+    """Append pruned rows to one gzip-compressed JSON lines file per day"""
+    partitions = {}
+    for id, name, dt, type, message in rows:
+        entry = {"id": id, "name": name, "datetime": dt, "type": type, "message": message}
+        partitions.setdefault(dt[:10], []).append(json.dumps(entry))
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    for day, lines in partitions.items():
+        with gzip.open(ARCHIVE_DIR / f"{day}.jsonl.gz", "at", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def _prune(type: str, days: int) -> int:
+    """Roll up, archive and delete one batch of expired entries of this type; return how many were pruned"""
+    with transaction(immediate=True) as conn:
+        rows = conn.execute(
+            """
+            SELECT id, name, datetime, type, message FROM logs
+            WHERE type = ? AND datetime < datetime('now', ?)
+            ORDER BY id
+            LIMIT ?
+            """,
+            (type, f"-{days} days", BATCH_SIZE),
+        ).fetchall()
+        if not rows:
+            return 0
+        ids = [(row[0],) for row in rows]
+        conn.executemany(
+            """
+            INSERT INTO log_rollups (name, hour, type, count, first_id, last_id)
+            VALUES (?, ?, ?, 1, ?, ?)
+            ON CONFLICT(name, hour, type) DO UPDATE SET
+                count = count + 1,
+                first_id = min(first_id, excluded.first_id),
+                last_id = max(last_id, excluded.last_id)
+            """,
+            [(name, dt[:13] + ":00:00", type, id, id) for id, name, dt, type, _ in rows],
+        )
+        conn.executemany("DELETE FROM logs WHERE id = ?", ids)
+        _archive(rows)
+    return len(rows)
+
+
+def _prune_spans(days: int) -> int:
+    """Delete one batch of expired spans; return how many were deleted"""
+    with transaction(immediate=True) as conn:
+        return conn.execute(
+            """
+            DELETE FROM spans WHERE id IN (
+                SELECT id FROM spans WHERE started_at < datetime('now', ?) LIMIT ?
+            )
+            """,
+            (f"-{days} days", BATCH_SIZE),
+        ).rowcount
+
+
+def apply_retention() -> dict[str, int]:
+    """Prune every log type, and the spans, past their retention period; return the number of entries pruned per type"""
+    policy = retention_policy()
+    types = [row[0] for row in get_connection().execute("SELECT DISTINCT type FROM logs")]
+    pruned = {}
+    for type in types:
+        days = policy.get(type, DEFAULT_RETENTION_DAYS)
+        if days is None:
+            continue
+        total = 0
+        while count := _prune(type, days):
+            total += count
+        if total:
+            pruned[type] = total
+    total = 0
+    while count := _prune_spans(SPAN_RETENTION_DAYS):
+        total += count
+    if total:
+        pruned["spans"] = total
+    return pruned
+
+
+def read_log_rollups(name: str, since: str | None = None) -> list[tuple[str, str, int]]:
+    """Return (hour, type, count) summaries of the pruned log entries for a given name"""
+    rows = get_connection().execute(
+        """
+        SELECT hour, type, count FROM log_rollups
+        WHERE name = ? AND hour >= ?
+        ORDER BY hour, type
+        """,
+        (name.lower(), since or ""),
+    )
+    return rows.fetchall()
+
+
+def read_archived_logs(
+    name: str, start: date, end: date | None = None, type: str | None = None
+) -> list[tuple[str, str, str]]:
+    """
+    Read pruned log entries back from the archive, for the days from start to end inclusive.
+    Returns a list of tuples containing (datetime, type, message), like database.read_log
+    """
+    end = end or start
+    results = []
+    day = start
+    while day <= end:
+        path = ARCHIVE_DIR / f"{day.isoformat()}.jsonl.gz"
+        if path.exists():
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry["name"] == name.lower() and (type is None or entry["type"] == type):
+                        results.append((entry["id"], entry["datetime"], entry["type"], entry["message"]))
+        day += timedelta(days=1)
+    return [row[1:] for row in sorted(results)]
+
+
+if __name__ == "__main__":
+    print(f"Pruned log entries: {apply_retention()}")
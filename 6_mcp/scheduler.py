@@ -0,0 +1,80 @@
+import asyncio
+import math
+import random
+import time
+from typing import Awaitable, Callable
+
+
+class TraderScheduler:
+    """
+    Runs traders in fixed-rate cycles: each cycle starts a whole period after the previous one started,
+    however long the traders take. Within a cycle, each trader starts after a random delay of up to
+    jitter_seconds, at most max_concurrency traders run at once, and a trader still running after
+    deadline_seconds is cancelled so one slow trader can't hold up the next cycle. A trader that fails is
+    logged and the others carry on.
+    """
+
+    def __init__(
+        self,
+        traders: list,
+        period_seconds: float,
+        max_concurrency: int,
+        jitter_seconds: float = 0,
+        deadline_seconds: float | None = None,
+    ):
+        self.traders = traders
+        self.period_seconds = period_seconds
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.jitter_seconds = jitter_seconds
+        self.deadline_seconds = deadline_seconds or period_seconds
+        self.overruns = 0
+        self.failures = 0
+        self.skipped_cycles = 0
+
+    async def run_trader(self, trader) -> None:
+        await asyncio.sleep(random.uniform(0, self.jitter_seconds))
+        async with self.semaphore:
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(trader.run(), self.deadline_seconds)
+            except asyncio.TimeoutError:
+                self.overruns += 1
+                print(f"Trader {trader.name} overran its {self.deadline_seconds:.0f}s deadline and was cancelled")
+                return
+            except (Exception, asyncio.CancelledError) as e:
+                # A cancellation from inside the trader is its failure; only stop if the scheduler is cancelled
+                if asyncio.current_task().cancelling():
+                    raise
+                self.failures += 1
+                print(f"Trader {trader.name} failed after {time.monotonic() - start:.0f}s: {e!r}")
+                return
+            print(f"Trader {trader.name} finished in {time.monotonic() - start:.0f}s")
+
+    async def run_cycle(self) -> None:
+        await asyncio.gather(*[self.run_trader(trader) for trader in self.traders])
+
+    async def run_forever(
+        self,
+        should_run: Callable[[], bool] = lambda: True,
+        before_cycle: Callable[[], Awaitable[None]] | None = None,
+        after_cycle: Callable[[], Awaitable[None]] | None = None,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        next_start = loop.time()
+        while True:
+            if should_run():
+                if before_cycle:
+                    await before_cycle()
+                await self.run_cycle()
+            else:
+                print("Market is closed, skipping run")
+            if after_cycle:
+                await after_cycle()
+            next_start += self.period_seconds
+            now = loop.time()
+            if next_start < now:
+                # Don't fire missed cycles back to back; wait for the next slot on the original schedule
+                missed = math.ceil((now - next_start) / self.period_seconds)
+                self.skipped_cycles += missed
+                next_start += missed * self.period_seconds
+            await asyncio.sleep(next_start - now)
@@ -0,0 +1,161 @@
+"""
+A deterministic local market for offline development and load tests, used whenever Polygon isn't available.
+Each symbol follows its own geometric Brownian motion: one step per trading day (weekday) since SIMULATOR_ORIGIN,
+then one step every SIMULATOR_STEP_SECONDS within the current day; a weekend repeats the Friday before it. Every shock is derived from (seed, symbol, step)
+by hashing, so a symbol's price at a given time is the same in every process and run, whatever else was looked up,
+and all symbols are priced together with NumPy. Prices follow clock.now(), so a backtest's simulated time moves them.
+"""
+
+import os
+import zlib
+import threading
+from datetime import date, datetime
+import numpy as np
+from dotenv import load_dotenv
+import clock
+
+load_dotenv(override=True)
+
+SIMULATOR_SEED = int(os.getenv("SIMULATOR_SEED", "42"))
+SIMULATOR_ORIGIN = date.fromisoformat(os.getenv("SIMULATOR_ORIGIN", "2020-01-01"))
+SIMULATOR_STEP_SECONDS = int(os.getenv("SIMULATOR_STEP_SECONDS", "60"))
+ANNUAL_DRIFT = 0.07
+ANNUAL_VOLATILITY = 0.3
+TRADING_DAYS = 252
+MIN_START_PRICE = 5.0
+MAX_START_PRICE = 500.0
+CHUNK = 512
+
+# Independent random streams, so the daily and intraday shocks and the starting prices never share a hash
+START_PRICE, DAILY, INTRADAY = 1, 2, 3
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """The splitmix64 finalizer: scrambles 64-bit integers into well-distributed random bits"""
+    with np.errstate(over="ignore"):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def _uniform(seed: int, stream: int, ids: np.ndarray, counters: np.ndarray) -> np.ndarray:
+    """Uniform numbers in (0, 1) for every pair of symbol id and counter, as an array of shape (ids, counters)"""
+    keys = _mix(_mix(np.uint64(seed) ^ _mix(np.uint64(stream))) ^ ids)
+    bits = _mix(keys[:, None] ^ _mix(counters.astype(np.uint64))[None, :])
+    return ((bits >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0**-53
+
+
+def _normal(seed: int, stream: int, ids: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """Standard normal shocks for steps start to stop-1 of each symbol, by the Box-Muller transform"""
+    counters = np.arange(start, stop, dtype=np.uint64)
+    u1 = _uniform(seed, 2 * stream, ids, counters)
+    u2 = _uniform(seed, 2 * stream + 1, ids, counters)
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+
+class MarketSimulator:
+    """Prices for any symbols at the current clock time; all lookups within one step see the same prices"""
+
+    def __init__(
+        self,
+        seed: int = SIMULATOR_SEED,
+        origin: date = SIMULATOR_ORIGIN,
+        step_seconds: int = SIMULATOR_STEP_SECONDS,
+        drift: float = ANNUAL_DRIFT,
+        volatility: float = ANNUAL_VOLATILITY,
+    ):
+        self.seed = seed
+        self.origin = origin
+        self.step_seconds = step_seconds
+        self.daily_sigma = volatility / np.sqrt(TRADING_DAYS)
+        self.daily_mu = drift / TRADING_DAYS - self.daily_sigma**2 / 2
+        self.step_sigma = self.daily_sigma * np.sqrt(step_seconds / 86_400)
+        self.index: dict[str, int] = {}
+        self.ids = np.empty(0, dtype=np.uint64)
+        self.open = np.empty(0)  # log price at the start of the current day
+        self.intraday = np.empty(0)  # log return since the start of the current day
+        self.day = None
+        self.step = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def symbol_id(symbol: str) -> int:
+        return zlib.crc32(symbol.upper().encode())
+
+    def _opening_log_prices(self, ids: np.ndarray, day: int) -> np.ndarray:
+        start = MIN_START_PRICE * (MAX_START_PRICE / MIN_START_PRICE) ** _uniform(
+            self.seed, START_PRICE, ids, np.zeros(1, dtype=np.uint64)
+        )[:, 0]
+        # Sum the daily shocks a block of symbols at a time, to bound memory for large universes
+        walk = np.concatenate(
+            [_normal(self.seed, DAILY, ids[i : i + CHUNK], 0, day).sum(axis=1) for i in range(0, len(ids), CHUNK)]
+            or [np.empty(0)]
+        )
+        return np.log(start) + day * self.daily_mu + self.daily_sigma * walk
+
+    def _intraday_returns(self, ids: np.ndarray, start: int, stop: int) -> np.ndarray:
+        counters_base = self.day * 86_400 // self.step_seconds
+        shocks = _normal(self.seed, INTRADAY, ids, counters_base + start, counters_base + stop)
+        return self.step_sigma * shocks.sum(axis=1)
+
+    def _advance(self, now: datetime):
+        # Count weekdays, not calendar days, since the volatility is scaled to TRADING_DAYS a year
+        trading_day = np.busday_offset(now.date(), 0, roll="backward")
+        day = max(int(np.busday_count(self.origin, trading_day)), 0)
+        step = (now.hour * 3600 + now.minute * 60 + now.second) // self.step_seconds
+        if day != self.day:
+            self.day, self.step = day, 0
+            self.open = self._opening_log_prices(self.ids, day)
+            self.intraday = np.zeros(len(self.ids))
+        if step < self.step:
+            # The clock went back within the day, e.g. a backtest restarting
+            self.intraday = self._intraday_returns(self.ids, 1, step + 1)
+            self.step = step
+        elif step > self.step:
+            self.intraday += self._intraday_returns(self.ids, self.step + 1, step + 1)
+            self.step = step
+
+    def _add(self, symbols: list[str]):
+        ids = np.array([self.symbol_id(symbol) for symbol in symbols], dtype=np.uint64)
+        for symbol in symbols:
+            self.index[symbol] = len(self.index)
+        self.ids = np.concatenate([self.ids, ids])
+        self.open = np.concatenate([self.open, self._opening_log_prices(ids, self.day)])
+        self.intraday = np.concatenate([self.intraday, self._intraday_returns(ids, 1, self.step + 1)])
+
+    def get_share_prices(self, symbols: list[str]) -> dict[str, float]:
+        with self._lock:
+            self._advance(clock.now())
+            new = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self.index]
+            if new:
+                self._add(new)
+            rows = np.array([self.index[symbol] for symbol in symbols], dtype=np.int64)
+            prices = np.round(np.exp(self.open[rows] + self.intraday[rows]), 2)
+        return dict(zip(symbols, prices.tolist()))
+
+    def get_share_price(self, symbol: str) -> float:
+        return self.get_share_prices([symbol])[symbol]
+
+
+simulator = MarketSimulator()
+
+
+if __name__ == "__main__":
+    # How fast the simulator prices a large universe: uv run simulator.py [symbols]
+    import sys
+    import time
+    from datetime import timedelta
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    symbols = [f"SIM{i}" for i in range(count)]
+    start = time.perf_counter()
+    simulator.get_share_prices(symbols)
+    print(f"First lookup of {count:,} symbols: {(time.perf_counter() - start) * 1000:.0f}ms")
+    start = time.perf_counter()
+    simulator.get_share_prices(symbols)
+    print(f"Same step again: {(time.perf_counter() - start) * 1000:.1f}ms")
+    clock.set_time(clock.now() + timedelta(seconds=SIMULATOR_STEP_SECONDS))
+    start = time.perf_counter()
+    simulator.get_share_prices(symbols)
+    print(f"Next step: {(time.perf_counter() - start) * 1000:.1f}ms")
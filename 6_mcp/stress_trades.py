@@ -0,0 +1,91 @@
+"""
+Fire thousands of concurrent trades at a few accounts from several processes and threads,
+then check that no transaction was lost: uv run stress_trades.py [processes] [threads] [trades]
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+STRESS_DB = "stress_accounts.db"
+NAMES = ["alpha", "beta"]
+SYMBOLS = ["AAPL", "MSFT", "NVDA"]
+PRICE = 10.0
+
+
+def fixed_prices(symbols: list[str]) -> dict[str, float]:
+    return {symbol: PRICE for symbol in symbols}
+
+
+def trade_worker(seed: int, threads: int, trades: int) -> int:
+    import database
+    import accounts
+    import market
+
+    database.DB = STRESS_DB
+    # Keep the market out of the measurement: every price lookup, in trades or valuations, is the same
+    market.set_price_source(fixed_prices)
+    completed = 0
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        nonlocal completed
+        rng = random.Random(thread_seed)
+        for _ in range(trades):
+            account = accounts.Account.get(rng.choice(NAMES))
+            symbol = rng.choice(SYMBOLS)
+            try:
+                if rng.random() < 0.6:
+                    account.buy_shares(symbol, rng.randint(1, 3), "stress")
+                else:
+                    account.sell_shares(symbol, 1, "stress")
+            except ValueError:
+                continue
+            with lock:
+                completed += 1
+
+    workers = [threading.Thread(target=run, args=(seed * 1000 + i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return completed
+
+
+def check(expected_trades: int) -> None:
+    import database
+    import accounts
+
+    database.DB = STRESS_DB
+    recorded = 0
+    for name in NAMES:
+        account = accounts.Account.get(name)
+        recorded += len(account.transactions)
+        positions = {}
+        for transaction in account.transactions:
+            positions[transaction.symbol] = positions.get(transaction.symbol, 0) + transaction.quantity
+        positions = {symbol: quantity for symbol, quantity in positions.items() if quantity}
+        cash = accounts.INITIAL_BALANCE - sum(transaction.total() for transaction in account.transactions)
+        assert positions == account.holdings, f"{name}: holdings {account.holdings} != transactions {positions}"
+        assert abs(cash - account.balance) < 1e-6, f"{name}: balance {account.balance} != transactions {cash}"
+    assert recorded == expected_trades, f"{expected_trades} trades completed but {recorded} recorded"
+
+
+def main(processes: int = 4, threads: int = 4, trades: int = 250) -> None:
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists(STRESS_DB + suffix):
+            os.remove(STRESS_DB + suffix)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(processes) as pool:
+        completed = sum(pool.map(trade_worker, range(processes), [threads] * processes, [trades] * processes))
+    elapsed = time.perf_counter() - start
+    check(completed)
+    print(f"{completed} trades from {processes * threads} concurrent writers in {elapsed:.1f}s", end=" ")
+    print(f"({completed / elapsed:,.0f} trades/s); no lost transactions")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
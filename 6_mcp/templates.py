@@ -1,4 +1,4 @@
-from datetime import datetime
+import clock
 from market import is_paid_polygon, is_realtime_polygon
 
 if is_realtime_polygon:
@@ -24,7 +24,7 @@ Also use it to store web addresses that you find interesting so you can check th
 Draw on your knowledge graph to build your expertise over time.
 
 If there isn't a specific request, then just respond with investment opportunities based on searching latest news.
-The current datetime is {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+The current datetime is {clock.now().strftime("%Y-%m-%d %H:%M:%S")}
 """
 
 def research_tool():
@@ -39,7 +39,8 @@ You are {name}, a trader on the stock market. Your account is under your name, {
 You actively manage your portfolio according to your strategy.
 You have access to tools including a researcher to research online for news and opportunities, based on your request.
 You also have tools to access to financial data for stocks. {note}
-And you have tools to buy and sell stocks using your account name {name}.
+And you have tools to buy and sell stocks using your account name {name}; to make several trades at once,
+such as when rebalancing, use execute_orders to place them all in a single call.
 You can use your entity tools as a persistent memory to store and recall information; you share
 this memory with other traders and can benefit from the group's knowledge.
 Use these tools to carry out research, make decisions, and execute trades.
@@ -58,10 +59,10 @@ You do not need to rebalance your portfolio; you will be asked to do so later.
 Just make trades based on your strategy as needed.
 Your investment strategy:
 {strategy}
-Here is your current account:
+Here is a summary of your current account, with your most recent trades:
 {account}
 Here is the current datetime:
-{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+{clock.now().strftime("%Y-%m-%d %H:%M:%S")}
 Now, carry out analysis, make your decision and execute trades. Your account name is {name}.
 After you've executed your trades, send a push notification with a brief sumnmary of trades and the health of the portfolio, then
 respond with a brief 2-3 sentence appraisal of your portfolio and its outlook.
@@ -77,10 +78,10 @@ Just rebalance your portfolio based on your strategy as needed.
 Your investment strategy:
 {strategy}
 You also have a tool to change your strategy if you wish; you can decide at any time that you would like to evolve or even switch your strategy.
-Here is your current account:
+Here is a summary of your current account, with your most recent trades:
 {account}
 Here is the current datetime:
-{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+{clock.now().strftime("%Y-%m-%d %H:%M:%S")}
 Now, carry out analysis, make your decision and execute trades. Your account name is {name}.
 After you've executed your trades, send a push notification with a brief sumnmary of trades and the health of the portfolio, then
 respond with a brief 2-3 sentence appraisal of your portfolio and its outlook."""
\ No newline at end of file
@@ -1,10 +1,15 @@
 from agents import TracingProcessor, Trace, Span
-from database import write_log
+from database import write_spans
+from log_writer import LogWriter
+from datetime import datetime
 import secrets
 import string
 
 ALPHANUM = string.ascii_lowercase + string.digits 
 
+# Span times are UTC, written so they sort and compare with SQLite's datetime('now')
+SPAN_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
 def make_trace_id(tag: str) -> str:
     """
     Return a string of the form 'trace_<tag><random>',
@@ -15,25 +20,32 @@ def make_trace_id(tag: str) -> str:
     random_suffix = ''.join(secrets.choice(ALPHANUM) for _ in range(pad_len))
     return f"trace_{tag}{random_suffix}"
 
+def get_name(trace_or_span: Trace | Span) -> str | None:
+    """The trader whose trace this is, from a trace id made by make_trace_id"""
+    trace_id = trace_or_span.trace_id
+    name = trace_id.split("_")[1]
+    if '0' in name:
+        return name.split("0")[0]
+    else:
+        return None
+
 class LogTracer(TracingProcessor):
 
+    def __init__(self, writer: LogWriter | None = None):
+        self.writer = writer or LogWriter()
+
     def get_name(self, trace_or_span: Trace | Span) -> str | None:
-        trace_id = trace_or_span.trace_id
-        name = trace_id.split("_")[1]
-        if '0' in name:
-            return name.split("0")[0]
-        else:
-            return None
+        return get_name(trace_or_span)
 
     def on_trace_start(self, trace) -> None:
         name = self.get_name(trace)
         if name:
-            write_log(name, "trace", f"Started: {trace.name}")
+            self.writer.submit(name, "trace", f"Started: {trace.name}")
 
     def on_trace_end(self, trace) -> None:
         name = self.get_name(trace)
         if name:
-            write_log(name, "trace", f"Ended: {trace.name}")
+            self.writer.submit(name, "trace", f"Ended: {trace.name}")
 
     def on_span_start(self, span) -> None:
         name = self.get_name(span)
@@ -49,7 +61,7 @@ class LogTracer(TracingProcessor):
                     message += f" {span.span_data.server}"
             if span.error:
                 message += f" {span.error}"
-            write_log(name, type, message)
+            self.writer.submit(name, type, message)
 
     def on_span_end(self, span) -> None:
         name = self.get_name(span)
@@ -66,10 +78,75 @@ class LogTracer(TracingProcessor):
                     message += f" {span.span_data.server}"
             if span.error:
                 message += f" {span.error}"
-            write_log(name, type, message)
+            self.writer.submit(name, type, message)
+
+    def metrics(self) -> dict:
+        return self.writer.metrics()
 
     def force_flush(self) -> None:
+        self.writer.flush()
+
+    def shutdown(self) -> None:
+        self.writer.shutdown()
+
+
+def span_attributes(span: Span) -> tuple[str | None, str | None, str | None, int | None, int | None]:
+    """The (tool, server, model, input_tokens, output_tokens) a span records, where it has them"""
+    data = span.span_data
+    tool = server = model = input_tokens = output_tokens = None
+    if data.type == "function":
+        tool = data.name
+        server = (data.mcp_data or {}).get("server")
+    elif data.type == "mcp_tools":
+        server = data.server
+    elif data.type == "generation":
+        model = data.model
+        usage = data.usage or {}
+        input_tokens, output_tokens = usage.get("input_tokens"), usage.get("output_tokens")
+    elif data.type == "response" and data.response:
+        model = data.response.model
+        usage = data.response.usage
+        if usage:
+            input_tokens, output_tokens = usage.input_tokens, usage.output_tokens
+    return tool, server, model, input_tokens, output_tokens
+
+class SpanTracer(TracingProcessor):
+    """
+    Record every finished span as a row of the spans table: when it ran and for how long, what kind of span it was,
+    the tool, MCP server or model it measured, the tokens it used and any error. Rows are written in batches
+    from a background thread, like the logs, and database.read_span_stats summarizes them.
+    """
+
+    def __init__(self, writer: LogWriter | None = None):
+        self.writer = writer or LogWriter(write=write_spans)
+
+    def on_trace_start(self, trace) -> None:
+        pass
+
+    def on_trace_end(self, trace) -> None:
+        pass
+
+    def on_span_start(self, span) -> None:
         pass
 
+    def on_span_end(self, span) -> None:
+        if not span.span_data or not span.started_at or not span.ended_at:
+            return
+        started_at = datetime.fromisoformat(span.started_at)
+        ended_at = datetime.fromisoformat(span.ended_at)
+        duration_ms = (ended_at - started_at).total_seconds() * 1000
+        tool, server, model, input_tokens, output_tokens = span_attributes(span)
+        error = span.error["message"] if span.error else None
+        self.writer.put((
+            span.trace_id, span.span_id, span.parent_id, get_name(span), span.span_data.type, tool, server, model,
+            started_at.strftime(SPAN_TIME_FORMAT), ended_at.strftime(SPAN_TIME_FORMAT), duration_ms, input_tokens, output_tokens, error,
+        ))
+
+    def metrics(self) -> dict:
+        return self.writer.metrics()
+
+    def force_flush(self) -> None:
+        self.writer.flush()
+
     def shutdown(self) -> None:
-        pass
\ No newline at end of file
+        self.writer.shutdown()
@@ -1,12 +1,11 @@
 from contextlib import AsyncExitStack
-from accounts_client import read_accounts_resource, read_strategy_resource
+from accounts_client import read_compact_account_resource, read_strategy_resource
 from tracers import make_trace_id
-from agents import Agent, Tool, Runner, OpenAIChatCompletionsModel, trace
-from openai import AsyncOpenAI
+from agents import Agent, Model, Tool, Runner, trace
+from typing import Callable
 from dotenv import load_dotenv
 import os
-import json
-from agents.mcp import MCPServerStdio
+from mcp_transports import create_mcp_server
 from templates import (
     researcher_instructions,
     trader_instructions,
@@ -15,6 +14,8 @@ from templates import (
     research_tool,
 )
 from mcp_params import trader_mcp_server_params, researcher_mcp_server_params
+from mcp_pool import MCPServerPool
+from rate_limits import ThrottledChatCompletionsModel, limiters, throttled_client
 
 load_dotenv(override=True)
 
@@ -30,21 +31,26 @@ OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
 MAX_TURNS = 30
 
-openrouter_client = AsyncOpenAI(base_url=OPENROUTER_BASE_URL, api_key=openrouter_api_key)
-deepseek_client = AsyncOpenAI(base_url=DEEPSEEK_BASE_URL, api_key=deepseek_api_key)
-grok_client = AsyncOpenAI(base_url=GROK_BASE_URL, api_key=grok_api_key)
-gemini_client = AsyncOpenAI(base_url=GEMINI_BASE_URL, api_key=google_api_key)
+# Models served without an API, by name, each made fresh for every agent, like the scripted models of a backtest
+local_models: dict[str, Callable[[], Model]] = {}
+
+openrouter_client = throttled_client(OPENROUTER_BASE_URL, openrouter_api_key)
+deepseek_client = throttled_client(DEEPSEEK_BASE_URL, deepseek_api_key)
+grok_client = throttled_client(GROK_BASE_URL, grok_api_key)
+gemini_client = throttled_client(GEMINI_BASE_URL, google_api_key)
 
 
 def get_model(model_name: str):
-    if "/" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=openrouter_client)
+    if model_name in local_models:
+        return local_models[model_name]()
+    elif "/" in model_name:
+        return ThrottledChatCompletionsModel(model_name, openrouter_client, limiters["openrouter"])
     elif "deepseek" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=deepseek_client)
+        return ThrottledChatCompletionsModel(model_name, deepseek_client, limiters["deepseek"])
     elif "grok" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=grok_client)
+        return ThrottledChatCompletionsModel(model_name, grok_client, limiters["grok"])
     elif "gemini" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=gemini_client)
+        return ThrottledChatCompletionsModel(model_name, gemini_client, limiters["gemini"])
     else:
         return model_name
 
@@ -65,13 +71,17 @@ async def get_researcher_tool(mcp_servers, model_name) -> Tool:
 
 
 class Trader:
-    def __init__(self, name: str, lastname="Trader", model_name="gpt-4o-mini"):
+    def __init__(self, name: str, lastname="Trader", model_name="gpt-4o-mini", mcp_pool: MCPServerPool | None = None):
         self.name = name
         self.lastname = lastname
         self.agent = None
         self.model_name = model_name
+        self.mcp_pool = mcp_pool
         self.do_trade = True
 
+    def mcp_server_params(self) -> list[dict]:
+        return trader_mcp_server_params + researcher_mcp_server_params(self.name)
+
     async def create_agent(self, trader_mcp_servers, researcher_mcp_servers) -> Agent:
         tool = await get_researcher_tool(researcher_mcp_servers, self.model_name)
         self.agent = Agent(
@@ -84,15 +94,15 @@ class Trader:
         return self.agent
 
     async def get_account_report(self) -> str:
-        account = await read_accounts_resource(self.name)
-        account_json = json.loads(account)
-        account_json.pop("portfolio_value_time_series", None)
-        return json.dumps(account_json)
+        return await read_compact_account_resource(self.name)
+
+    async def get_strategy(self) -> str:
+        return await read_strategy_resource(self.name)
 
     async def run_agent(self, trader_mcp_servers, researcher_mcp_servers):
         self.agent = await self.create_agent(trader_mcp_servers, researcher_mcp_servers)
         account = await self.get_account_report()
-        strategy = await read_strategy_resource(self.name)
+        strategy = await self.get_strategy()
         message = (
             trade_message(self.name, strategy, account)
             if self.do_trade
@@ -101,18 +111,19 @@ class Trader:
         await Runner.run(self.agent, message, max_turns=MAX_TURNS)
 
     async def run_with_mcp_servers(self):
+        if self.mcp_pool:
+            trader_mcp_servers = self.mcp_pool.get(trader_mcp_server_params)
+            researcher_mcp_servers = self.mcp_pool.get(researcher_mcp_server_params(self.name))
+            await self.run_agent(trader_mcp_servers, researcher_mcp_servers)
+            return
         async with AsyncExitStack() as stack:
             trader_mcp_servers = [
-                await stack.enter_async_context(
-                    MCPServerStdio(params, client_session_timeout_seconds=120)
-                )
+                await stack.enter_async_context(create_mcp_server(params))
                 for params in trader_mcp_server_params
             ]
             async with AsyncExitStack() as stack:
                 researcher_mcp_servers = [
-                    await stack.enter_async_context(
-                        MCPServerStdio(params, client_session_timeout_seconds=120)
-                    )
+                    await stack.enter_async_context(create_mcp_server(params))
                     for params in researcher_mcp_server_params(self.name)
                 ]
                 await self.run_agent(trader_mcp_servers, researcher_mcp_servers)
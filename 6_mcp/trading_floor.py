@@ -1,9 +1,14 @@
 from traders import Trader
 from typing import List
 import asyncio
-from tracers import LogTracer
+import json
+from tracers import LogTracer, SpanTracer
 from agents import add_trace_processor
 from market import is_market_open
+from retention import apply_retention
+from mcp_pool import MCPServerPool
+from scheduler import TraderScheduler
+from rate_limits import provider_stats
 from dotenv import load_dotenv
 import os
 
@@ -14,11 +19,25 @@ RUN_EVEN_WHEN_MARKET_IS_CLOSED = (
     os.getenv("RUN_EVEN_WHEN_MARKET_IS_CLOSED", "false").strip().lower() == "true"
 )
 USE_MANY_MODELS = os.getenv("USE_MANY_MODELS", "false").strip().lower() == "true"
+MAX_CONCURRENT_TRADERS = int(os.getenv("MAX_CONCURRENT_TRADERS", "4"))
+START_JITTER_SECONDS = float(os.getenv("START_JITTER_SECONDS", "30"))
+TRADER_DEADLINE_MINUTES = float(os.getenv("TRADER_DEADLINE_MINUTES", str(RUN_EVERY_N_MINUTES)))
+
+# Optionally, a JSON file listing the traders, each like:
+# {"name": "Warren", "lastname": "Patience", "model_name": "gpt-4o-mini", "short_model_name": "GPT 4o mini"}
+TRADERS_CONFIG = os.getenv("TRADERS_CONFIG")
 
 names = ["Warren", "George", "Ray", "Cathie"]
 lastnames = ["Patience", "Bold", "Systematic", "Crypto"]
 
-if USE_MANY_MODELS:
+if TRADERS_CONFIG:
+    with open(TRADERS_CONFIG) as f:
+        config = json.load(f)
+    names = [trader["name"] for trader in config]
+    lastnames = [trader.get("lastname", "Trader") for trader in config]
+    model_names = [trader.get("model_name", "gpt-4o-mini") for trader in config]
+    short_model_names = [trader.get("short_model_name", model_name) for trader, model_name in zip(config, model_names)]
+elif USE_MANY_MODELS:
     model_names = [
         "gpt-4.1-mini",
         "deepseek-chat",
@@ -31,22 +50,40 @@ else:
     short_model_names = ["GPT 4o mini"] * 4
 
 
-def create_traders() -> List[Trader]:
+def create_traders(mcp_pool: MCPServerPool | None = None) -> List[Trader]:
     traders = []
     for name, lastname, model_name in zip(names, lastnames, model_names):
-        traders.append(Trader(name, lastname, model_name))
+        traders.append(Trader(name, lastname, model_name, mcp_pool))
     return traders
 
 
 async def run_every_n_minutes():
-    add_trace_processor(LogTracer())
-    traders = create_traders()
-    while True:
-        if RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open():
-            await asyncio.gather(*[trader.run() for trader in traders])
-        else:
-            print("Market is closed, skipping run")
-        await asyncio.sleep(RUN_EVERY_N_MINUTES * 60)
+    log_tracer, span_tracer = LogTracer(), SpanTracer()
+    add_trace_processor(log_tracer)
+    add_trace_processor(span_tracer)
+    async with MCPServerPool() as mcp_pool:
+        traders = create_traders(mcp_pool)
+        for trader in traders:
+            await mcp_pool.start(trader.mcp_server_params())
+
+        async def after_cycle():
+            tracers = [{"tracer": "log", **log_tracer.metrics()}, {"tracer": "span", **span_tracer.metrics()}]
+            for stats in mcp_pool.report() + provider_stats() + tracers:
+                print(stats)
+            await asyncio.to_thread(apply_retention)
+
+        scheduler = TraderScheduler(
+            traders,
+            period_seconds=RUN_EVERY_N_MINUTES * 60,
+            max_concurrency=MAX_CONCURRENT_TRADERS,
+            jitter_seconds=START_JITTER_SECONDS,
+            deadline_seconds=TRADER_DEADLINE_MINUTES * 60,
+        )
+        await scheduler.run_forever(
+            should_run=lambda: RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open(),
+            before_cycle=mcp_pool.check_health,
+            after_cycle=after_cycle,
+        )
 
 
 if __name__ == "__main__":